@@ -0,0 +1,169 @@
+"""Кеши в памяти процесса."""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+__all__: List[str] = [
+    "TTLCache",
+    "VersionRegistry",
+    "caches"
+]
+
+# Все созданные кеши по имени, для метрик
+caches: Dict[str, "TTLCache"] = {}
+
+
+class TTLCache:
+    """
+    Потокобезопасный LRU-кеш с ограничением времени жизни записей.
+    Поколение (generation) растёт при каждой инвалидации: значение, прочитанное из БД
+    до инвалидации, не попадёт в кеш, если при set передать поколение момента чтения.
+    """
+
+    def __init__(self, name: str, max_size: int, ttl: float):
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        caches[name] = self
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_size > 0
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Возвращает значение или None, если записи нет или она устарела."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            expires_at, value = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, generation: Optional[int] = None, ttl: Optional[float] = None) -> None:
+        """
+        Сохраняет значение. None не кешируется.
+        :param generation: Поколение на момент чтения значения из источника.
+        :param ttl: Время жизни записи, если оно отличается от общего.
+        """
+        if not self.enabled or value is None:
+            return
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._generation += 1
+            self.invalidations += 1
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self.invalidations += 1
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                "name": self.name,
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / requests if requests else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations
+            }
+
+
+class VersionRegistry:
+    """
+    Копия версий данных (каталога, корзин пользователей) для ETag. Сами версии хранятся в БД
+    и растут в транзакции каждого изменения, поэтому все воркеры выдают одинаковые ETag.
+    Реестр обновляют уведомления об изменениях; ключа, которого в нём нет, вызывающий код
+    читает из БД и сохраняет через update с поколением момента чтения.
+    Пока enabled ложно (изменения из других воркеров могли быть пропущены), ETag
+    выдаётся, но ответ 304 по нему давать нельзя.
+    """
+
+    def __init__(self, name: str, max_size: int):
+        self.name = name
+        self.max_size = max_size
+        self.enabled = False
+        self._versions: "OrderedDict[Hashable, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self, key: Hashable = None) -> Optional[int]:
+        with self._lock:
+            version = self._versions.get(key)
+            if version is not None:
+                self._versions.move_to_end(key)
+            return version
+
+    def update(self, key: Hashable, version: int, generation: Optional[int] = None) -> None:
+        """
+        Запоминает версию ключа. Версии в БД только растут, поэтому более старая не заменяет
+        уже известную, а прочитанная до invalidate или reset (другое поколение) не сохраняется.
+        """
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._versions[key] = max(version, self._versions.get(key, version))
+            self._versions.move_to_end(key)
+            while len(self._versions) > self.max_size:
+                self._versions.popitem(last=False)
+
+    def invalidate(self, key: Hashable = None) -> None:
+        """Забывает версию ключа: она изменилась, новая будет прочитана из БД или придёт в уведомлении."""
+        with self._lock:
+            self._generation += 1
+            self._versions.pop(key, None)
+
+    def reset(self) -> None:
+        """Забывает все версии (уведомления могли быть пропущены)."""
+        with self._lock:
+            self._generation += 1
+            self._versions.clear()
+
+    def etag(self, key: Hashable, *versions: int) -> str:
+        # Ключ входит в ETag: у разных пользователей один и тот же URL (/cart)
+        prefix = self.name if key is None else f"{self.name}-{key}"
+        return f'W/"{prefix}-{"-".join(map(str, versions))}"'
@@ -1,171 +1,251 @@
 # [file name]: database/cart.py
-from typing import List
+from typing import List, Optional
 from logging import Logger
 from psycopg2 import OperationalError, InterfaceError
 from psycopg2.extras import RealDictCursor
-from .connect import connect
+from .connect import get_async_connection
+from .statements import statement, prepare_async
+from ..cache import VersionRegistry
 from ..logger import configure_logs
-from ..models.cart import Cart
-
-logger: Logger = configure_logs(__name__)
-
-
-def get_user_cart(user_id: int) -> List[Cart]:
-    """Получает содержимое корзины пользователя"""
-    logger.info(f"Получение корзины для пользователя {user_id}")
-    conn = None
+from ..metrics import timed_query
+from ..models.cart import Cart, CartItem, CartUpdate
+from .product import get_catalog_version
+from ..static import CART_VERSIONS_MAX_SIZE, LOG_HOT_PATH_SAMPLE_RATE
+
+# Корзина — горячий путь, её INFO-записи сохраняются выборочно
+logger: Logger = configure_logs(__name__, sample_rate=LOG_HOT_PATH_SAMPLE_RATE)
+
+# Канал LISTEN/NOTIFY для изменений корзин; полезная нагрузка — "<версия корзины>:<id пользователя>"
+CART_CHANGES_CHANNEL = "cart_changes"
+# Предваряет изменяющий запрос: несколько команд в одном execute выполняются одной
+# транзакцией, поэтому версия растёт и уведомление уходит только вместе с изменением
+# и без лишнего обращения к БД
+CART_NOTIFY = statement("cart_notify", f"""
+    WITH version AS (
+        INSERT INTO cart_versions (user_id, version)
+        VALUES (%(user_id)s::integer, 1)
+        ON CONFLICT (user_id) DO UPDATE SET version = cart_versions.version + 1
+        RETURNING version
+    )
+    SELECT pg_notify('{CART_CHANGES_CHANNEL}', version || ':' || %(user_id)s::integer)
+    FROM version
+""")
+NOTIFY_CART_CHANGE = CART_NOTIFY.sql + ";\n"
+
+CART_BY_USER = statement("cart_by_user", """
+    SELECT c.id,
+           c.product_id,
+           c.amount,
+           c.user_id,
+           p.name,
+           p.cost,
+           CASE
+               WHEN p.icon_hash IS NOT NULL
+                   THEN '/products/' || p.id || '/icon?v=' || p.icon_hash
+               ELSE NULL
+               END as icon_url
+    FROM cart c
+             JOIN products p ON c.product_id = p.id
+    WHERE c.user_id = %(user_id)s
+    ORDER BY p.name
+""")
+
+# Изменение позиции корзины: удаление при amount <= 0, иначе UPSERT (INSERT ON CONFLICT UPDATE)
+_CART_DELETE_ITEM = """
+    DELETE
+    FROM cart
+    WHERE user_id = %(user_id)s
+      AND product_id = %(product_id)s
+    RETURNING id, product_id, 0 as amount, user_id
+"""
+_CART_UPSERT_ITEM = """
+    INSERT INTO cart (user_id, product_id, amount)
+    VALUES (%(user_id)s, %(product_id)s, %(amount)s)
+    ON CONFLICT (user_id, product_id)
+        DO UPDATE SET amount = EXCLUDED.amount
+    RETURNING id, product_id, amount, user_id
+"""
+# Изменение и данные товара — одним запросом
+_CART_ITEM_DETAILS = """
+    WITH changed AS ({change})
+    SELECT c.id,
+           c.product_id,
+           c.amount,
+           c.user_id,
+           p.name,
+           p.cost,
+           CASE
+               WHEN p.icon_hash IS NOT NULL
+                   THEN '/products/' || p.id || '/icon?v=' || p.icon_hash
+               ELSE NULL
+               END as icon_url
+    FROM changed c
+             JOIN products p ON c.product_id = p.id
+"""
+# (добавление или обновление, с данными товара) -> запрос
+CART_ITEM_CHANGES = {
+    (False, False): statement("cart_delete_item", _CART_DELETE_ITEM),
+    (True, False): statement("cart_upsert_item", _CART_UPSERT_ITEM),
+    (False, True): statement("cart_delete_item_details", _CART_ITEM_DETAILS.format(change=_CART_DELETE_ITEM)),
+    (True, True): statement("cart_upsert_item_details", _CART_ITEM_DETAILS.format(change=_CART_UPSERT_ITEM))
+}
+
+# Версии корзин пользователей для ETag (таблица cart_versions)
+cart_versions = VersionRegistry("cart", CART_VERSIONS_MAX_SIZE)
+
+
+@timed_query
+async def _load_cart_version(user_id: int) -> int:
+    generation = cart_versions.generation
+    async with get_async_connection() as conn, conn.cursor() as cur:
+        await cur.execute("SELECT COALESCE((SELECT version FROM cart_versions WHERE user_id = %s), 0)", (user_id,))
+        version = (await cur.fetchone())[0]
+    cart_versions.update(user_id, version, generation)
+    return version
+
+
+async def cart_etag(user_id: int) -> str:
+    """
+    ETag корзины: версия корзины и версия каталога, так как в ответе есть имена, цены
+    и иконки товаров, а удаление товара удаляет и позиции корзины.
+    """
+    version: Optional[int] = cart_versions.get(user_id)
+    if version is None:
+        version = await _load_cart_version(user_id)
+    return cart_versions.etag(user_id, version, await get_catalog_version())
+
+
+@timed_query
+async def get_user_cart(user_id: int) -> List[dict]:
+    """Получает содержимое корзины пользователя: строки с полями модели Cart"""
+    logger.info("Получение корзины для пользователя %s", user_id)
     try:
-        conn = connect()
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            query = """
-                    SELECT c.id, \
-                           c.product_id, \
-                           c.amount, \
-                           c.user_id, \
-                           p.name, \
-                           p.cost, \
-                           CASE \
-                               WHEN p.icon IS NOT NULL \
-                                   THEN encode(p.icon::bytea, 'base64') \
-                               ELSE NULL \
-                               END as icon
-                    FROM cart c
-                             JOIN products p ON c.product_id = p.id
-                    WHERE c.user_id = %s
-                    ORDER BY p.name \
-                    """
-            cur.execute(query, (user_id,))
-            results = cur.fetchall()
-            return [Cart(**row) for row in results]
+        async with get_async_connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            await cur.execute(await prepare_async(cur, CART_BY_USER), {"user_id": user_id})
+            return await cur.fetchall()
 
     except (OperationalError, InterfaceError) as e:
-        logger.error(f"Ошибка соединения: {e}")
+        logger.error("Ошибка соединения: %s", e)
         raise
     except Exception as e:
-        logger.error(f"Ошибка при получении корзины: {e}")
+        logger.error("Ошибка при получении корзины: %s", e)
         raise
-    finally:
-        if conn:
-            conn.close()
 
 
-def clear_user_cart(user_id: int):
-    logger.info(f"Очистка корзины для пользователя {user_id}")
-    conn = None
+@timed_query
+async def clear_user_cart(user_id: int):
+    logger.info("Очистка корзины для пользователя %s", user_id)
     try:
-        conn = connect()
-        with conn.cursor() as cur:
-            cur.execute("DELETE FROM cart WHERE user_id = %s", (user_id,))
-            conn.commit()
+        async with get_async_connection() as conn, conn.cursor() as cur:
+            await cur.execute(NOTIFY_CART_CHANGE + "DELETE FROM cart WHERE user_id = %(user_id)s",
+                              {"user_id": user_id})
+        cart_versions.invalidate(user_id)
     except Exception as e:
-        logger.error(f"Ошибка очистки корзины: {e}")
+        logger.error("Ошибка очистки корзины: %s", e)
         raise
-    finally:
-        if conn:
-            conn.close()
 
 
-def update_cart_item_amount(user_id: int, product_id: int, amount: int) -> int | None:
-    logger.info(f"Изменение количества товара с id {product_id} у пользователя с id {user_id}")
-    conn = None
-    try:
-        conn = connect()
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            query = """
-                    INSERT INTO cart (user_id, product_id, amount)
-                    VALUES (%s, %s, %s)
-                    ON CONFLICT (user_id, product_id)
-                        DO UPDATE SET amount = EXCLUDED.amount
-                    RETURNING amount
-                    """
-            cur.execute(query, (user_id, product_id, amount))
+async def update_cart_item_amount(user_id: int, product_id: int, amount: int) -> int | None:
+    """Облегчённое изменение количества: без данных товара, возвращает новое количество."""
+    item = await update_cart_item(user_id, product_id, amount, details=False)
+    return item.amount if item else None
 
-            result = cur.fetchone()
-            conn.commit()
+
+@timed_query
+async def update_cart_item(user_id: int, product_id: int, amount: int,
+                           details: bool = True) -> Cart | CartItem | None:
+    """
+    Добавляет, обновляет или (при amount <= 0) удаляет позицию корзины одним запросом.
+    :param details: Вернуть позицию вместе с данными товара (Cart) или только саму позицию (CartItem).
+    """
+    logger.info("Обновление корзины для пользователя %s", user_id)
+    try:
+        async with get_async_connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            change = CART_ITEM_CHANGES[(amount > 0, details)]
+            # Уведомление и изменение — одним обращением к серверу, как с NOTIFY_CART_CHANGE
+            query = await prepare_async(cur, CART_NOTIFY, change)
+            await cur.execute(query, {"user_id": user_id, "product_id": product_id, "amount": amount})
+            result = await cur.fetchone()
+            cart_versions.invalidate(user_id)
 
             if not result:
                 return None
 
-            return result['amount']
+            return Cart(**result) if details else CartItem(**result)
     except (OperationalError, InterfaceError) as e:
-        logger.error(f"Ошибка соединения: {e}")
+        logger.error("Ошибка соединения: %s", e)
         raise
     except Exception as e:
-        logger.error(f"Ошибка при обновлении корзины: {e}")
-        if conn:
-            conn.rollback()
+        logger.error("Ошибка при обновлении корзины: %s", e)
         raise
-    finally:
-        if conn:
-            conn.close()
 
 
-def update_cart_item(user_id: int, product_id: int, amount: int) -> Cart:
-    logger.info(f"Обновление корзины для пользователя {user_id}")
-    conn = None
+@timed_query
+async def update_cart_items(user_id: int, items: List[CartUpdate]) -> List[Cart]:
+    """
+    Применяет пачку изменений корзины одним запросом: позиции с amount <= 0 удаляются,
+    остальные добавляются или обновляются. Для повторяющихся product_id действует последнее
+    изменение. Возвращает корзину после изменений.
+    """
+    logger.info("Пакетное обновление корзины пользователя %s: %s позиций", user_id, len(items))
     try:
-        conn = connect()
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            # Удаляем запись если количество <= 0
-            if amount <= 0:
-                query = """
-                        DELETE \
-                        FROM cart
-                        WHERE user_id = %s \
-                          AND product_id = %s
-                        RETURNING *
-                        """
-                cur.execute(query, (user_id, product_id))
-            else:
-                # Используем UPSERT (INSERT ON CONFLICT UPDATE)
-                query = """
-                        INSERT INTO cart (user_id, product_id, amount)
-                        VALUES (%s, %s, %s)
-                        ON CONFLICT (user_id, product_id)
-                            DO UPDATE SET amount = EXCLUDED.amount
-                        RETURNING *
-                        """
-                cur.execute(query, (user_id, product_id, amount))
-
-            result = cur.fetchone()
-            conn.commit()
-
-            if not result:
-                return None
-
-            # Получаем полную информацию о продукте
-            product_query = """
-                            SELECT id, \
-                                   name, \
-                                   cost, \
-                                   CASE \
-                                       WHEN icon IS NOT NULL \
-                                           THEN encode(icon::bytea, 'base64') \
-                                       ELSE NULL \
-                                       END as icon
-                            FROM products \
-                            WHERE id = %s \
-                            """
-            cur.execute(product_query, (product_id,))
-            product_info = cur.fetchone()
-
-            return Cart(
-                id=result['id'],
-                product_id=product_id,
-                user_id=user_id,
-                amount=result['amount'],
-                name=product_info['name'],
-                cost=product_info['cost'],
-                icon=product_info['icon']
-            )
+        async with get_async_connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            # Изменения CTE не видны основному запросу, поэтому итоговая корзина собирается
+            # из нетронутых строк и результата upsert
+            query = """
+                    WITH input AS (SELECT DISTINCT ON (product_id) product_id, amount
+                                   FROM unnest(%(product_ids)s::int[], %(amounts)s::int[])
+                                            WITH ORDINALITY AS t(product_id, amount, ord)
+                                   ORDER BY product_id, ord DESC),
+                         deleted AS (
+                             DELETE FROM cart c
+                                 USING input i
+                                 WHERE c.user_id = %(user_id)s
+                                     AND c.product_id = i.product_id
+                                     AND i.amount <= 0
+                                 RETURNING c.id),
+                         upserted AS (
+                             INSERT INTO cart (user_id, product_id, amount)
+                                 SELECT %(user_id)s, product_id, amount
+                                 FROM input
+                                 WHERE amount > 0
+                                 ON CONFLICT (user_id, product_id)
+                                     DO UPDATE SET amount = EXCLUDED.amount
+                                 RETURNING id, product_id, amount, user_id),
+                         result AS (SELECT c.id, c.product_id, c.amount, c.user_id
+                                    FROM cart c
+                                    WHERE c.user_id = %(user_id)s
+                                      AND c.product_id NOT IN (SELECT product_id FROM input)
+                                    UNION ALL
+                                    SELECT id, product_id, amount, user_id
+                                    FROM upserted)
+                    SELECT r.id,
+                           r.product_id,
+                           r.amount,
+                           r.user_id,
+                           p.name,
+                           p.cost,
+                           CASE
+                               WHEN p.icon_hash IS NOT NULL
+                                   THEN '/products/' || p.id || '/icon?v=' || p.icon_hash
+                               ELSE NULL
+                               END as icon_url
+                    FROM result r
+                             JOIN products p ON r.product_id = p.id
+                    ORDER BY p.name
+                    """
+            params = {
+                "user_id": user_id,
+                "product_ids": [item.product_id for item in items],
+                "amounts": [item.amount for item in items]
+            }
+            await cur.execute(NOTIFY_CART_CHANGE + query, params)
+            results = await cur.fetchall()
+            cart_versions.invalidate(user_id)
+            return [Cart(**row) for row in results]
     except (OperationalError, InterfaceError) as e:
-        logger.error(f"Ошибка соединения: {e}")
+        logger.error("Ошибка соединения: %s", e)
         raise
     except Exception as e:
-        logger.error(f"Ошибка при обновлении корзины: {e}")
-        if conn:
-            conn.rollback()
+        logger.error("Ошибка при пакетном обновлении корзины: %s", e)
         raise
-    finally:
-        if conn:
-            conn.close()
\ No newline at end of file
@@ -1,10 +1,49 @@
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, asynccontextmanager
+from logging import Logger
+from typing import AsyncIterator, Deque, Dict, Iterator, List, Optional, Tuple
+
+import aiopg
 import psycopg2
+from psycopg2 import extensions
 from psycopg2._psycopg import connection
 
-from ..static import DATA_SOURCE
+from .instrumentation import InstrumentedConnection, InstrumentedAsyncConnection
+from ..logger import configure_logs
+from ..timing import record_db_time
+from ..static import (
+    DATA_SOURCE,
+    DB_POOL_MIN_SIZE,
+    DB_POOL_MAX_SIZE,
+    DB_POOL_TIMEOUT,
+    DB_POOL_MAX_IDLE,
+    DB_POOL_MAX_LIFETIME,
+    DB_POOL_CHECK_INTERVAL,
+    DB_ASYNC_POOL_MIN_SIZE,
+    DB_ASYNC_POOL_MAX_SIZE
+)
+
+__all__ = [
+    "connect",
+    "ConnectionPool",
+    "PoolTimeoutError",
+    "get_pool",
+    "get_connection",
+    "close_pool",
+    "get_async_pool",
+    "get_async_connection",
+    "close_async_pool",
+    "pool_stats"
+]
+logger: Logger = configure_logs(__name__)
 
 
-def connect():
+def connect() -> connection:
+    """Открывает новое соединение с БД, минуя пул."""
     try:
         db_connection: connection = psycopg2.connect(
             dsn=DATA_SOURCE,
@@ -13,4 +52,324 @@ def connect():
         return db_connection
 
     except Exception as e:
-        print(e)
+        logger.error("Ошибка подключения к БД: %s", e)
+        raise
+
+
+class PoolTimeoutError(Exception):
+    def __init__(self, message='Не удалось получить соединение из пула за отведённое время'):
+        super().__init__(message)
+
+
+class ConnectionPool:
+    """
+    Потокобезопасный пул соединений с PostgreSQL.
+    Соединения проверяются при выдаче, простаивающие сверх min_size закрываются,
+    а слишком старые пересоздаются.
+    """
+
+    def __init__(self, min_size: int, max_size: int, timeout: float,
+                 max_idle: float, max_lifetime: float, check_interval: float):
+        self.min_size = min_size
+        self.max_size = max(max_size, min_size, 1)
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.check_interval = check_interval
+
+        self._cond = threading.Condition()
+        # (соединение, время последнего возврата в пул)
+        self._idle: Deque[Tuple[connection, float]] = deque()
+        # время создания каждого открытого соединения
+        self._created: Dict[int, float] = {}
+        # количество соединений, открываемых прямо сейчас
+        self._opening = 0
+        self._closed = False
+        # счётчики для метрик
+        self._waiting = 0
+        self.opened = 0
+        self.discarded = 0
+        self.timeouts = 0
+
+    @property
+    def size(self) -> int:
+        """Количество открытых соединений (свободных и выданных)."""
+        return len(self._created)
+
+    @property
+    def idle(self) -> int:
+        return len(self._idle)
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            return {
+                "size": self.size,
+                "idle": self.idle,
+                "in_use": self.size - self.idle,
+                "opening": self._opening,
+                "waiting": self._waiting,
+                "max_size": self.max_size,
+                "opened": self.opened,
+                "discarded": self.discarded,
+                "timeouts": self.timeouts
+            }
+
+    def fill(self) -> None:
+        """Заранее открывает min_size соединений."""
+        while self.size + self._opening < self.min_size:
+            with self._cond:
+                self._opening += 1
+            conn = self._open()
+            self.putconn(conn)
+
+    def getconn(self) -> connection:
+        deadline = time.monotonic() + self.timeout
+        while True:
+            conn, last_used = self._checkout(deadline)
+            if conn is None:
+                return self._open()
+            # Проверка выполняется вне блокировки, чтобы не задерживать другие потоки
+            if self._is_usable(conn, last_used):
+                return conn
+            with self._cond:
+                self._forget(conn)
+                self._cond.notify()
+            self._close(conn)
+
+    def _checkout(self, deadline: float) -> Tuple[Optional[connection], float]:
+        """Забирает свободное соединение либо резервирует место под новое (возвращает None)."""
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolTimeoutError('Пул соединений закрыт')
+                if self._idle:
+                    return self._idle.pop()
+                if self.size + self._opening < self.max_size:
+                    self._opening += 1
+                    return None, 0.0
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.timeouts += 1
+                    logger.error("Пул соединений исчерпан: %s из %s заняты", self.size, self.max_size)
+                    raise PoolTimeoutError()
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+    def putconn(self, conn: connection) -> None:
+        # Откат и закрытие ходят на сервер, поэтому выполняются вне блокировки пула
+        reusable = False
+        try:
+            if not conn.closed:
+                status = conn.info.transaction_status
+                if status != extensions.TRANSACTION_STATUS_UNKNOWN:
+                    if status != extensions.TRANSACTION_STATUS_IDLE:
+                        # Не оставляем открытых транзакций (в т.ч. после простых SELECT)
+                        conn.rollback()
+                    reusable = True
+        except Exception as e:
+            logger.warning("Соединение не возвращено в пул: %s", e)
+            reusable = False
+
+        now = time.monotonic()
+        with self._cond:
+            if reusable and not self._closed and now - self._created.get(id(conn), now) <= self.max_lifetime:
+                self._idle.append((conn, now))
+                discarded = self._shrink(now)
+            else:
+                self._forget(conn)
+                discarded = [conn]
+            self._cond.notify()
+        for old in discarded:
+            self._close(old)
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            discarded = [conn for conn, _ in self._idle]
+            self._idle.clear()
+            for conn in discarded:
+                self._forget(conn)
+            self._cond.notify_all()
+        for conn in discarded:
+            self._close(conn)
+
+    def _open(self) -> connection:
+        try:
+            conn = connect()
+        except Exception:
+            with self._cond:
+                self._opening -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._opening -= 1
+            self.opened += 1
+            self._created[id(conn)] = time.monotonic()
+        return conn
+
+    def _forget(self, conn: connection) -> None:
+        """Убирает соединение из учёта пула; вызывается под блокировкой."""
+        if self._created.pop(id(conn), None) is not None:
+            self.discarded += 1
+
+    @staticmethod
+    def _close(conn: connection) -> None:
+        try:
+            if not conn.closed:
+                conn.close()
+        except Exception as e:
+            logger.warning("Ошибка при закрытии соединения: %s", e)
+
+    def _is_usable(self, conn: connection, last_used: float) -> bool:
+        if conn.closed:
+            return False
+
+        now = time.monotonic()
+        if now - self._created.get(id(conn), now) > self.max_lifetime:
+            return False
+        if now - last_used < self.check_interval:
+            return True
+
+        # Соединение долго простаивало: проверяем, что сервер его не закрыл
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception as e:
+            logger.warning("Соединение из пула не прошло проверку: %s", e)
+            return False
+
+    def _shrink(self, now: float) -> List[connection]:
+        """
+        Убирает из пула простаивающие соединения сверх min_size (самые старые — первыми)
+        и возвращает их: закрывать их вызывающий должен уже без блокировки.
+        """
+        discarded = []
+        while self._idle and self.size > self.min_size and now - self._idle[0][1] > self.max_idle:
+            conn, _ = self._idle.popleft()
+            self._forget(conn)
+            discarded.append(conn)
+        return discarded
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_pid: Optional[int] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """Возвращает пул текущего процесса, создавая его при первом обращении."""
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is None or _pool_pid != pid:
+        with _pool_lock:
+            if _pool is None or _pool_pid != pid:
+                # После fork соединения родителя использовать нельзя
+                _pool = ConnectionPool(
+                    min_size=DB_POOL_MIN_SIZE,
+                    max_size=DB_POOL_MAX_SIZE,
+                    timeout=DB_POOL_TIMEOUT,
+                    max_idle=DB_POOL_MAX_IDLE,
+                    max_lifetime=DB_POOL_MAX_LIFETIME,
+                    check_interval=DB_POOL_CHECK_INTERVAL
+                )
+                _pool_pid = pid
+    return _pool
+
+
+@contextmanager
+def get_connection() -> Iterator[InstrumentedConnection]:
+    """
+    Выдаёт соединение из пула и возвращает его обратно по выходу из блока.
+    При исключении незавершённая транзакция откатывается.
+    Курсоры соединения замеряют каждый запрос (см. instrumentation).
+    """
+    # Время запроса в БД считается от ожидания соединения до его возврата в пул
+    started = time.perf_counter()
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        yield InstrumentedConnection(conn)
+    except Exception:
+        if not conn.closed:
+            try:
+                conn.rollback()
+            except Exception as e:
+                logger.warning("Ошибка отката транзакции: %s", e)
+        raise
+    finally:
+        pool.putconn(conn)
+        record_db_time(time.perf_counter() - started)
+
+
+def close_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.close()
+        _pool = None
+
+
+_async_pool: Optional[aiopg.Pool] = None
+_async_pool_lock = asyncio.Lock()
+
+
+async def get_async_pool() -> aiopg.Pool:
+    """
+    Возвращает асинхронный пул текущего процесса, создавая его при первом обращении.
+    Соединения асинхронного пула всегда работают в режиме autocommit,
+    транзакции открываются явно через cursor.begin().
+    """
+    global _async_pool
+    if _async_pool is None:
+        async with _async_pool_lock:
+            if _async_pool is None:
+                _async_pool = await aiopg.create_pool(
+                    dsn=DATA_SOURCE,
+                    port=5432,
+                    minsize=DB_ASYNC_POOL_MIN_SIZE,
+                    maxsize=DB_ASYNC_POOL_MAX_SIZE,
+                    pool_recycle=DB_POOL_MAX_LIFETIME,
+                    enable_hstore=False
+                )
+    return _async_pool
+
+
+@asynccontextmanager
+async def get_async_connection() -> AsyncIterator[InstrumentedAsyncConnection]:
+    """Выдаёт соединение из асинхронного пула и возвращает его по выходу из блока."""
+    started = time.perf_counter()
+    pool = await get_async_pool()
+    try:
+        async with pool.acquire() as conn:
+            yield InstrumentedAsyncConnection(conn)
+    finally:
+        record_db_time(time.perf_counter() - started)
+
+
+async def close_async_pool() -> None:
+    global _async_pool
+    if _async_pool is not None:
+        _async_pool.close()
+        await _async_pool.wait_closed()
+    _async_pool = None
+
+
+def pool_stats() -> Dict[str, Dict[str, int]]:
+    """Состояние уже созданных пулов текущего процесса (для метрик)."""
+    stats = {}
+    if _pool is not None and _pool_pid == os.getpid():
+        stats["sync"] = _pool.stats()
+    if _async_pool is not None:
+        stats["async"] = {
+            "size": _async_pool.size,
+            "idle": _async_pool.freesize,
+            "in_use": _async_pool.size - _async_pool.freesize,
+            "max_size": _async_pool.maxsize
+        }
+    return stats
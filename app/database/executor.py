@@ -0,0 +1,101 @@
+import asyncio
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict, List, TypeVar
+
+from ..static import DB_POOL_MAX_SIZE
+
+__all__: List[str] = [
+    "DatabaseExecutor",
+    "db_executor",
+    "run_sync"
+]
+T = TypeVar("T")
+
+
+class DatabaseExecutor:
+    """
+    Ограниченный пул потоков для вызова синхронных функций БД из async-кода.
+    Собирает метрики очереди: текущую и максимальную глубину, время ожидания потока.
+    """
+
+    def __init__(self, name: str, max_workers: int):
+        self.name = name
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-executor")
+        self._lock = threading.Lock()
+
+        self._queued = 0
+        self._running = 0
+        self._max_queue_depth = 0
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+
+    async def run(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Выполняет func в пуле потоков, не блокируя цикл событий."""
+        loop = asyncio.get_running_loop()
+        submitted_at = time.monotonic()
+        with self._lock:
+            self._submitted += 1
+            self._queued += 1
+            self._max_queue_depth = max(self._max_queue_depth, self._queued)
+
+        # Контекст (contextvars) запроса передаётся в поток вместе с задачей
+        context = contextvars.copy_context()
+        job = partial(self._call, submitted_at, func, *args, **kwargs)
+        return await loop.run_in_executor(self._executor, context.run, job)
+
+    def _call(self, submitted_at: float, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        waited = time.monotonic() - submitted_at
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+            self._wait_time_total += waited
+            self._wait_time_max = max(self._wait_time_max, waited)
+        failed = False
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._completed += 1
+                self._failed += failed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            started = self._completed + self._running
+            return {
+                "name": self.name,
+                "max_workers": self.max_workers,
+                "queue_depth": self._queued,
+                "max_queue_depth": self._max_queue_depth,
+                "running": self._running,
+                "submitted": self._submitted,
+                "completed": self._completed,
+                "failed": self._failed,
+                "wait_time_total": self._wait_time_total,
+                "wait_time_max": self._wait_time_max,
+                "wait_time_avg": self._wait_time_total / started if started else 0.0
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
+
+
+# Размер совпадает с синхронным пулом соединений: потоки никогда не ждут соединения,
+# а число одновременных синхронных запросов к БД ограничено размером пула
+db_executor = DatabaseExecutor("db", DB_POOL_MAX_SIZE)
+
+
+async def run_sync(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Выполняет синхронную функцию из app/database в общем пуле потоков БД."""
+    return await db_executor.run(func, *args, **kwargs)
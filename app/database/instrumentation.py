@@ -0,0 +1,206 @@
+import random
+import re
+import time
+from contextlib import asynccontextmanager
+from logging import Logger
+from typing import Any, AsyncIterator, List
+
+from psycopg2 import extensions
+
+from .statements import statements
+from ..logger import configure_logs
+from ..metrics import metrics, DB_BUCKETS, query_name
+from ..static import DB_SLOW_QUERY_THRESHOLD, DB_SLOW_QUERY_EXPLAIN_RATE
+
+__all__: List[str] = [
+    "InstrumentedConnection",
+    "InstrumentedAsyncConnection",
+    "statement_name",
+    "redact"
+]
+logger: Logger = configure_logs(__name__)
+
+metrics.histogram("db_statement_duration_seconds", "Время отдельных SQL-запросов", DB_BUCKETS)
+metrics.counter("db_statement_rows_total", "Строки, возвращённые или изменённые SQL-запросами")
+metrics.counter("db_slow_statements_total", "SQL-запросы дольше DB_SLOW_QUERY_THRESHOLD")
+
+_VERB = re.compile(r"\s*(?:--[^\n]*\n\s*)*(\w+)")
+# EXPLAIN ANALYZE выполняет запрос повторно, поэтому разбираются только одиночные чтения
+_WRITES = re.compile(r"\b(INSERT|UPDATE|DELETE|MERGE|COPY|pg_notify|nextval|setval)\b", re.IGNORECASE)
+_EXECUTE = re.compile(r"EXECUTE\s+(\w+)", re.IGNORECASE)
+
+
+def statement_name(query: str) -> str:
+    """Имя запроса для метрик и журнала: функция доступа к БД и первое слово SQL."""
+    match = _VERB.match(query)
+    verb = match.group(1).lower() if match else "sql"
+    return f"{query_name.get()}.{verb}"
+
+
+def redact(params: Any) -> Any:
+    """Параметры запроса без значений: только типы (и длина строк), структура сохраняется."""
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {key: redact(value) for key, value in params.items()}
+    if isinstance(params, (list, tuple)):
+        return [redact(value) for value in params]
+    if isinstance(params, (str, bytes, memoryview)):
+        return f"<{type(params).__name__}:{len(params)}>"
+    return f"<{type(params).__name__}>"
+
+
+def _compact(query: str) -> str:
+    return " ".join(query.split())
+
+
+def _explainable(query: str) -> bool:
+    text = query.strip().rstrip(";")
+    if ";" in text:
+        return False
+    # EXPLAIN EXECUTE снимает план подготовленного запроса; читает ли он, видно по его исходному SQL
+    execute = _EXECUTE.match(text)
+    if execute:
+        prepared = statements.get(execute.group(1))
+        return prepared is not None and _explainable(prepared.sql)
+    return bool(re.match(r"(SELECT|WITH)\b", text, re.IGNORECASE)) and not _WRITES.search(text)
+
+
+def _record(name: str, query: str, params: Any, duration: float, rows: int) -> bool:
+    """Пишет метрики запроса; возвращает True, если нужно снять план."""
+    metrics.observe("db_statement_duration_seconds", duration, statement=name)
+    if rows > 0:
+        metrics.inc("db_statement_rows_total", rows, statement=name)
+    if DB_SLOW_QUERY_THRESHOLD <= 0 or duration < DB_SLOW_QUERY_THRESHOLD:
+        return False
+    metrics.inc("db_slow_statements_total", statement=name)
+    logger.warning(
+        "Медленный запрос %s: %.1f мс, строк %s; %s; параметры %s",
+        name, duration * 1000, rows if rows >= 0 else "?", _compact(query), redact(params)
+    )
+    return DB_SLOW_QUERY_EXPLAIN_RATE > 0 and random.random() < DB_SLOW_QUERY_EXPLAIN_RATE and _explainable(query)
+
+
+def _in_transaction(raw: extensions.connection) -> bool:
+    return raw.info.transaction_status == extensions.TRANSACTION_STATUS_INTRANS
+
+
+class InstrumentedCursor:
+    """
+    Курсор psycopg2, который замеряет каждый запрос: время, число строк, медленные запросы.
+    Остальные атрибуты и методы передаются исходному курсору.
+    """
+
+    def __init__(self, cursor: extensions.cursor, connection: extensions.connection):
+        object.__setattr__(self, "_cursor", cursor)
+        object.__setattr__(self, "_connection", connection)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        setattr(self._cursor, name, value)
+
+    def __enter__(self) -> "InstrumentedCursor":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self._cursor.close()
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def execute(self, query: str, params: Any = None) -> None:
+        name = statement_name(query)
+        started = time.perf_counter()
+        self._cursor.execute(query, params)
+        if _record(name, query, params, time.perf_counter() - started, self._cursor.rowcount):
+            self._explain(name, query, params)
+
+    def copy_expert(self, sql: str, file: Any, size: int = 8192) -> None:
+        name = statement_name(sql)
+        started = time.perf_counter()
+        self._cursor.copy_expert(sql, file, size)
+        _record(name, sql, None, time.perf_counter() - started, self._cursor.rowcount)
+
+    def _explain(self, name: str, query: str, params: Any) -> None:
+        # Точка сохранения: ошибка EXPLAIN не должна прерывать транзакцию вызывающего кода
+        savepoint = _in_transaction(self._connection)
+        try:
+            with self._connection.cursor() as cur:
+                if savepoint:
+                    cur.execute("SAVEPOINT explain_slow_query")
+                try:
+                    cur.execute("EXPLAIN (ANALYZE, BUFFERS) " + query, params)
+                    plan = "\n".join(row[0] for row in cur.fetchall())
+                finally:
+                    if savepoint:
+                        cur.execute("ROLLBACK TO SAVEPOINT explain_slow_query")
+            logger.warning("План медленного запроса %s:\n%s", name, plan)
+        except Exception as e:
+            logger.warning("Не удалось получить план запроса %s: %s", name, e)
+
+
+class InstrumentedConnection:
+    """Соединение psycopg2, выдающее InstrumentedCursor."""
+
+    def __init__(self, connection: extensions.connection):
+        self._connection = connection
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._connection, name)
+
+    def cursor(self, *args: Any, **kwargs: Any) -> InstrumentedCursor:
+        return InstrumentedCursor(self._connection.cursor(*args, **kwargs), self._connection)
+
+
+class AsyncInstrumentedCursor:
+    """То же для курсора aiopg."""
+
+    def __init__(self, cursor: Any, connection: Any):
+        object.__setattr__(self, "_cursor", cursor)
+        object.__setattr__(self, "_connection", connection)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        setattr(self._cursor, name, value)
+
+    async def execute(self, query: str, params: Any = None) -> None:
+        name = statement_name(query)
+        started = time.perf_counter()
+        await self._cursor.execute(query, params)
+        if _record(name, query, params, time.perf_counter() - started, self._cursor.rowcount):
+            await self._explain(name, query, params)
+
+    async def _explain(self, name: str, query: str, params: Any) -> None:
+        savepoint = _in_transaction(self._connection.raw)
+        try:
+            async with self._connection.cursor() as cur:
+                if savepoint:
+                    await cur.execute("SAVEPOINT explain_slow_query")
+                try:
+                    await cur.execute("EXPLAIN (ANALYZE, BUFFERS) " + query, params)
+                    plan = "\n".join(row[0] for row in await cur.fetchall())
+                finally:
+                    if savepoint:
+                        await cur.execute("ROLLBACK TO SAVEPOINT explain_slow_query")
+            logger.warning("План медленного запроса %s:\n%s", name, plan)
+        except Exception as e:
+            logger.warning("Не удалось получить план запроса %s: %s", name, e)
+
+
+class InstrumentedAsyncConnection:
+    """Соединение aiopg, выдающее AsyncInstrumentedCursor."""
+
+    def __init__(self, connection: Any):
+        self._connection = connection
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._connection, name)
+
+    @asynccontextmanager
+    async def cursor(self, *args: Any, **kwargs: Any) -> AsyncIterator[AsyncInstrumentedCursor]:
+        async with self._connection.cursor(*args, **kwargs) as cur:
+            yield AsyncInstrumentedCursor(cur, self._connection)
@@ -0,0 +1,275 @@
+"""
+Версионированная схема БД. Миграции применяются по порядку, каждая в своей транзакции;
+номера применённых хранятся в schema_migrations. Отдельно проверяется, что на месте индексы,
+на которые рассчитаны горячие запросы.
+
+    python -m app.database.migrations           # применить недостающие миграции
+    python -m app.database.migrations --check   # только проверить (код возврата 1 при расхождениях)
+"""
+import argparse
+import sys
+from logging import Logger
+from typing import List, Optional, Sequence, Tuple
+
+from .connect import get_connection, close_pool
+from ..logger import configure_logs
+
+__all__: List[str] = [
+    "Migration",
+    "ExpectedIndex",
+    "MIGRATIONS",
+    "EXPECTED_INDEXES",
+    "migrate",
+    "schema_version",
+    "missing_indexes",
+    "check_schema",
+    "SchemaVersionError"
+]
+logger: Logger = configure_logs(__name__)
+
+# Ключ pg_advisory_xact_lock: воркеры, стартующие одновременно, применяют миграции по очереди
+MIGRATIONS_LOCK_ID = 4_120_017_024
+
+
+class SchemaVersionError(Exception):
+    def __init__(self, version: int, latest: int):
+        super().__init__(f"Схема БД версии {version}, последняя миграция — {latest}: "
+                         f"python -m app.database.migrations")
+
+
+class Migration:
+    __slots__ = ("version", "description", "sql")
+
+    def __init__(self, version: int, description: str, sql: str):
+        self.version = version
+        self.description = description
+        self.sql = sql
+
+
+class ExpectedIndex:
+    """
+    Индекс, нужный запросу. Подходит любой действующий индекс таблицы нужного типа (method),
+    ключ которого начинается с columns (для unique — уникальный ровно по columns) и содержит
+    include среди ключевых или INCLUDE-колонок. Индекс, для которого нужно расширение
+    (extension), ожидается только там, где расширение установлено.
+    """
+
+    __slots__ = ("table", "columns", "unique", "include", "method", "extension", "purpose")
+
+    def __init__(self, table: str, columns: Sequence[str], purpose: str, unique: bool = False,
+                 include: Sequence[str] = (), method: str = "btree", extension: Optional[str] = None):
+        self.table = table
+        self.columns = tuple(columns)
+        self.unique = unique
+        self.include = tuple(include)
+        self.method = method
+        self.extension = extension
+        self.purpose = purpose
+
+    def matches(self, keys: Sequence[str], included: Sequence[str], unique: bool, method: str) -> bool:
+        if method != self.method:
+            return False
+        if self.unique and (not unique or set(keys) != set(self.columns)):
+            return False
+        if tuple(keys[:len(self.columns)]) != self.columns:
+            return False
+        return set(self.include) <= set(keys) | set(included)
+
+    def __str__(self) -> str:
+        description = f"{self.table} USING {self.method} ({', '.join(self.columns)})"
+        if self.include:
+            description += f" INCLUDE ({', '.join(self.include)})"
+        return ("UNIQUE " if self.unique else "") + description
+
+
+MIGRATIONS: List[Migration] = [
+    # Схема, которая до появления миграций создавалась вручную: на существующей БД ничего не меняет
+    Migration(1, "Таблицы users, products, cart", """
+        CREATE TABLE IF NOT EXISTS users (
+            id       serial PRIMARY KEY,
+            username text NOT NULL UNIQUE,
+            password text NOT NULL,
+            role     text NOT NULL DEFAULT 'user'
+        );
+        CREATE TABLE IF NOT EXISTS products (
+            id          serial PRIMARY KEY,
+            name        text    NOT NULL UNIQUE,
+            description text,
+            cost        integer NOT NULL,
+            icon        bytea
+        );
+        CREATE TABLE IF NOT EXISTS cart (
+            id         serial PRIMARY KEY,
+            user_id    integer NOT NULL REFERENCES users (id),
+            product_id integer NOT NULL REFERENCES products (id) ON DELETE CASCADE,
+            amount     integer NOT NULL,
+            UNIQUE (user_id, product_id)
+        );
+    """),
+    Migration(2, "Покрывающий индекс корзины и индекс сортировки каталога по имени", """
+        CREATE INDEX IF NOT EXISTS cart_user_id_covering_idx ON cart (user_id) INCLUDE (id, product_id, amount);
+        CREATE INDEX IF NOT EXISTS products_name_id_idx ON products (name, id);
+    """),
+    # Имя весит больше описания. Триграммы (нечёткий поиск) — только если сервер поставляет pg_trgm
+    Migration(3, "Полнотекстовый и триграммный поиск товаров", """
+        ALTER TABLE products ADD COLUMN IF NOT EXISTS search_document tsvector GENERATED ALWAYS AS (
+            setweight(to_tsvector('russian', name), 'A') ||
+            setweight(to_tsvector('russian', COALESCE(description, '')), 'B')
+        ) STORED;
+        CREATE INDEX IF NOT EXISTS products_search_document_idx ON products USING gin (search_document);
+        DO $$
+        BEGIN
+            IF EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm') THEN
+                CREATE EXTENSION IF NOT EXISTS pg_trgm;
+                CREATE INDEX IF NOT EXISTS products_name_trgm_idx ON products USING gin (name gin_trgm_ops);
+            ELSE
+                RAISE WARNING 'pg_trgm is not available, fuzzy product search is disabled';
+            END IF;
+        END
+        $$;
+    """),
+    # Хеш иконки считается при записи: по нему строятся ETag и версия в icon_url
+    Migration(4, "Хеш иконки товара", """
+        ALTER TABLE products ADD COLUMN IF NOT EXISTS icon_hash text GENERATED ALWAYS AS (md5(icon)) STORED;
+    """),
+    # Версии для ETag растут в транзакции изменения: строка блокируется до COMMIT,
+    # поэтому версии одного ключа фиксируются по порядку
+    Migration(5, "Версии каталога и корзин для ETag", """
+        CREATE TABLE IF NOT EXISTS change_versions (
+            name    text PRIMARY KEY,
+            version bigint NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS cart_versions (
+            user_id integer PRIMARY KEY REFERENCES users (id) ON DELETE CASCADE,
+            version bigint  NOT NULL
+        );
+    """)
+]
+
+EXPECTED_INDEXES: List[ExpectedIndex] = [
+    ExpectedIndex("users", ["username"], "поиск пользователя при входе и регистрации", unique=True),
+    ExpectedIndex("products", ["name"], "уникальность имени и ON CONFLICT (name) при импорте", unique=True),
+    ExpectedIndex("products", ["name", "id"], "каталог с sort=name и keyset-пагинацией"),
+    ExpectedIndex("cart", ["user_id", "product_id"], "ON CONFLICT (user_id, product_id) в корзине", unique=True),
+    ExpectedIndex("cart", ["user_id"], "корзина пользователя без обращения к таблице (index-only scan)",
+                  include=["id", "product_id", "amount"]),
+    ExpectedIndex("products", ["search_document"], "полнотекстовый поиск /products/search", method="gin"),
+    ExpectedIndex("products", ["name"], "нечёткий поиск и автодополнение по имени (pg_trgm)",
+                  method="gin", extension="pg_trgm")
+]
+
+_CREATE_VERSIONS_TABLE = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version    integer PRIMARY KEY,
+        applied_at timestamptz NOT NULL DEFAULT now()
+    )
+"""
+
+# Ключевые и INCLUDE-колонки действующих индексов (частичные и по выражениям не учитываются)
+_INDEXES_QUERY = """
+    SELECT t.relname AS table_name,
+           am.amname AS method,
+           i.indisunique AS is_unique,
+           ARRAY(SELECT a.attname::text
+                 FROM unnest(i.indkey::int2[]) WITH ORDINALITY AS k(attnum, position)
+                          JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = k.attnum
+                 WHERE k.position <= i.indnkeyatts
+                 ORDER BY k.position) AS keys,
+           ARRAY(SELECT a.attname::text
+                 FROM unnest(i.indkey::int2[]) WITH ORDINALITY AS k(attnum, position)
+                          JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = k.attnum
+                 WHERE k.position > i.indnkeyatts
+                 ORDER BY k.position) AS included,
+           0 = ANY (i.indkey::int2[]) AS has_expressions
+    FROM pg_index i
+             JOIN pg_class t ON t.oid = i.indrelid
+             JOIN pg_class ic ON ic.oid = i.indexrelid
+             JOIN pg_am am ON am.oid = ic.relam
+    WHERE t.relnamespace = current_schema()::regnamespace
+      AND t.relname = ANY (%s)
+      AND i.indisvalid
+      AND i.indpred IS NULL
+"""
+
+
+def schema_version(cur) -> int:
+    """Номер последней применённой миграции (0, если миграции не применялись)."""
+    cur.execute("SELECT to_regclass('schema_migrations') IS NOT NULL")
+    if not cur.fetchone()[0]:
+        return 0
+    cur.execute("SELECT COALESCE(max(version), 0) FROM schema_migrations")
+    return cur.fetchone()[0]
+
+
+def migrate() -> int:
+    """Применяет недостающие миграции и возвращает их количество."""
+    applied = 0
+    with get_connection() as conn, conn.cursor() as cur:
+        for migration in MIGRATIONS:
+            cur.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATIONS_LOCK_ID,))
+            cur.execute(_CREATE_VERSIONS_TABLE)
+            # Версия перечитывается под блокировкой: её мог поднять другой воркер
+            if schema_version(cur) >= migration.version:
+                conn.commit()
+                continue
+            logger.info("Применение миграции %s: %s", migration.version, migration.description)
+            cur.execute(migration.sql)
+            cur.execute("INSERT INTO schema_migrations (version) VALUES (%s)", (migration.version,))
+            conn.commit()
+            applied += 1
+    return applied
+
+
+def missing_indexes(cur) -> List[ExpectedIndex]:
+    cur.execute("SELECT extname FROM pg_extension")
+    extensions = {name for name, in cur.fetchall()}
+    expected_indexes = [index for index in EXPECTED_INDEXES if index.extension in (None, *extensions)]
+
+    cur.execute(_INDEXES_QUERY, (sorted({index.table for index in expected_indexes}),))
+    existing: List[Tuple[str, str, bool, List[str], List[str]]] = [
+        (table, method, unique, keys, included)
+        for table, method, unique, keys, included, has_expressions in cur.fetchall() if not has_expressions
+    ]
+    return [
+        expected for expected in expected_indexes
+        if not any(table == expected.table and expected.matches(keys, included, unique, method)
+                   for table, method, unique, keys, included in existing)
+    ]
+
+
+def check_schema(strict: bool = False) -> bool:
+    """
+    Предупреждает о неприменённых миграциях и отсутствующих индексах; True, если всё на месте.
+    С strict неприменённые миграции — SchemaVersionError: код рассчитан на последнюю схему.
+    """
+    with get_connection() as conn, conn.cursor() as cur:
+        version = schema_version(cur)
+        missing = missing_indexes(cur)
+        conn.rollback()
+
+    latest = MIGRATIONS[-1].version
+    if version < latest:
+        if strict:
+            raise SchemaVersionError(version, latest)
+        logger.warning("Схема БД версии %s, последняя миграция — %s: python -m app.database.migrations",
+                       version, latest)
+    for index in missing:
+        # Без индекса запрос не упадёт, а молча перейдёт на последовательное чтение таблицы
+        logger.warning("Нет индекса %s: %s", index, index.purpose)
+    return version >= latest and not missing
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Миграции схемы БД")
+    parser.add_argument("--check", action="store_true", help="Только проверить версию схемы и индексы")
+    args = parser.parse_args()
+    try:
+        if not args.check:
+            logger.info("Применено миграций: %s", migrate())
+        ok = check_schema()
+    finally:
+        close_pool()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
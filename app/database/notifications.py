@@ -0,0 +1,130 @@
+import asyncio
+from logging import Logger
+from typing import List, Optional
+
+import aiopg
+
+from .cart import CART_CHANGES_CHANNEL, cart_versions
+from .product import (
+    PRODUCT_CHANGES_CHANNEL,
+    PRODUCT_CHANGES_ALL,
+    PRODUCT_CHANGES_RELOAD,
+    product_cache,
+    catalog_versions,
+    invalidate_product_cache
+)
+from ..logger import configure_logs
+from ..static import DATA_SOURCE, PRODUCT_CHANGES_HEALTH_CHECK_INTERVAL, PRODUCT_CHANGES_RECONNECT_MAX_DELAY
+
+__all__: List[str] = [
+    "ChangeListener",
+    "change_listener"
+]
+logger: Logger = configure_logs(__name__)
+
+
+class ChangeListener:
+    """
+    Фоновая задача воркера: слушает каналы изменений каталога и корзин,
+    сбрасывает локальный кеш товаров и меняет версии для ETag.
+    Использует отдельное соединение вне пула. После любого разрыва переподключается
+    и полностью очищает кеш, так как уведомления за время разрыва потеряны.
+    Пока подписки нет, ответы 304 по версиям отключены.
+    """
+
+    channels = (PRODUCT_CHANGES_CHANNEL, CART_CHANGES_CHANNEL)
+
+    def __init__(self, health_check_interval: float, reconnect_max_delay: float):
+        self.health_check_interval = health_check_interval
+        self.reconnect_max_delay = reconnect_max_delay
+        self.connected = False
+        self.received = 0
+        self.reconnects = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="change-listener")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._set_connected(False)
+
+    async def _run(self) -> None:
+        delay = 1.0
+        while True:
+            try:
+                async with aiopg.connect(dsn=DATA_SOURCE, port=5432, enable_hstore=False) as conn:
+                    async with conn.cursor() as cur:
+                        for channel in self.channels:
+                            await cur.execute(f"LISTEN {channel}")
+                    self._flush()
+                    self._set_connected(True)
+                    delay = 1.0
+                    logger.info("Подписка на каналы %s установлена", ", ".join(self.channels))
+                    await self._listen(conn)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Подписка на каналы изменений прервана: %s", e)
+
+            if self.connected:
+                self.reconnects += 1
+            self._set_connected(False)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.reconnect_max_delay)
+
+    async def _listen(self, conn: aiopg.Connection) -> None:
+        while True:
+            try:
+                message = await asyncio.wait_for(conn.notifies.get(), timeout=self.health_check_interval)
+            except asyncio.TimeoutError:
+                # Уведомлений давно не было: убеждаемся, что соединение живо
+                async with conn.cursor() as cur:
+                    await cur.execute("SELECT 1")
+                continue
+            self.received += 1
+            self._handle(message.channel, message.payload)
+
+    def _set_connected(self, connected: bool) -> None:
+        self.connected = connected
+        catalog_versions.enabled = connected
+        cart_versions.enabled = connected
+
+    @staticmethod
+    def _handle(channel: str, payload: str) -> None:
+        try:
+            # "<новая версия>:<что изменилось>"
+            version, _, changed = payload.partition(":")
+            version = int(version)
+            if channel == CART_CHANGES_CHANNEL:
+                cart_versions.update(int(changed), version)
+            elif changed == PRODUCT_CHANGES_ALL:
+                invalidate_product_cache(version=version)
+            elif changed == PRODUCT_CHANGES_RELOAD:
+                product_cache.clear()
+                invalidate_product_cache(version=version)
+            else:
+                invalidate_product_cache(int(changed), version)
+        except ValueError:
+            logger.warning("Неизвестное уведомление в канале %s: %s", channel, payload)
+            ChangeListener._flush()
+
+    @staticmethod
+    def _flush() -> None:
+        product_cache.clear()
+        invalidate_product_cache()
+        catalog_versions.reset()
+        cart_versions.reset()
+
+
+change_listener = ChangeListener(
+    health_check_interval=PRODUCT_CHANGES_HEALTH_CHECK_INTERVAL,
+    reconnect_max_delay=PRODUCT_CHANGES_RECONNECT_MAX_DELAY
+)
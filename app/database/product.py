@@ -1,99 +1,574 @@
-from typing import Optional, List
+import csv
+import io
+import json
+import re
+import time
+from typing import Any, AsyncIterator, BinaryIO, Optional, List, Tuple, Dict, Iterator
 from logging import Logger
 
 from psycopg2 import OperationalError, InterfaceError
 from psycopg2.extras import RealDictCursor
 from psycopg2.errors import UniqueViolation
+from pydantic import ValidationError
 
-from .connect import connect
+from .connect import get_async_connection, get_connection
+from .statements import statement, prepare_async
+from ..cache import TTLCache, VersionRegistry
 from ..logger import configure_logs
-from ..models.product import Product, ProductCreate
+from ..metrics import timed_query, query_name
+from ..models.product import Product, ProductBase, ProductCreate, ProductSort, ProductImportFormat
+from ..static import (
+    PRODUCT_CACHE_TTL,
+    PRODUCT_CACHE_MAX_SIZE,
+    CATALOG_CACHE_MAX_SIZE,
+    SEARCH_CACHE_MAX_SIZE,
+    LOG_HOT_PATH_SAMPLE_RATE
+)
 
 __all__: List[str] = [
+    "PRODUCT_COLUMNS",
     "get_all_products",
+    "search_products",
+    "normalize_search_text",
+    "iter_products",
+    "import_products",
     "get_product",
+    "get_product_icon",
     "create_product",
     "update_product",
-    "delete_product"
+    "delete_product",
+    "product_cache",
+    "catalog_cache",
+    "search_cache",
+    "catalog_versions",
+    "get_catalog_version",
+    "catalog_etag",
+    "invalidate_product_cache",
+    "notify_product_change",
+    "PRODUCT_CHANGES_CHANNEL",
+    "PRODUCT_CHANGES_ALL",
+    "PRODUCT_CHANGES_RELOAD"
 ]
 logger: Logger = configure_logs(__name__)
+# Чтение каталога — горячий путь, его INFO-записи сохраняются выборочно
+read_logger: Logger = configure_logs(f"{__name__}.read", sample_rate=LOG_HOT_PATH_SAMPLE_RATE)
 
+# Канал LISTEN/NOTIFY для изменений каталога; полезная нагрузка — "<версия каталога>:<что изменилось>":
+# id товара, "*" (только страницы каталога) или "reload" (изменено много товаров, сбросить весь кеш)
+PRODUCT_CHANGES_CHANNEL = "product_changes"
+PRODUCT_CHANGES_ALL = "*"
+PRODUCT_CHANGES_RELOAD = "reload"
+
+# Отдельные товары по id и страницы каталога по параметрам запроса
+product_cache = TTLCache("products", PRODUCT_CACHE_MAX_SIZE, PRODUCT_CACHE_TTL)
+catalog_cache = TTLCache("catalog", CATALOG_CACHE_MAX_SIZE, PRODUCT_CACHE_TTL)
+# Страницы результатов поиска по нормализованному запросу
+search_cache = TTLCache("search", SEARCH_CACHE_MAX_SIZE, PRODUCT_CACHE_TTL)
+# Версия каталога для ETag (строка catalog в change_versions): растёт при любом изменении товаров
+catalog_versions = VersionRegistry("catalog", 1)
+
+# Поднимает версию каталога и сообщает о ней вместе с изменением (NOTIFY доставляется после COMMIT)
+_NOTIFY_PRODUCT_CHANGE = """
+    WITH version AS (
+        INSERT INTO change_versions (name, version)
+        VALUES ('catalog', 1)
+        ON CONFLICT (name) DO UPDATE SET version = change_versions.version + 1
+        RETURNING version
+    )
+    SELECT pg_notify(%(channel)s, version || ':' || %(payload)s)
+    FROM version
+"""
+
+
+def invalidate_product_cache(product_id: Optional[int] = None, version: Optional[int] = None) -> None:
+    """
+    Сбрасывает закешированный товар и все страницы каталога и поиска, в которые он мог попасть.
+    :param version: Новая версия каталога из уведомления; без неё версия перечитается из БД.
+    """
+    if product_id is not None:
+        product_cache.invalidate(product_id)
+    catalog_cache.clear()
+    search_cache.clear()
+    if version is None:
+        catalog_versions.invalidate()
+    else:
+        catalog_versions.update(None, version)
+
+
+async def notify_product_change(cur, product_id: Optional[int] = None) -> None:
+    """
+    Поднимает версию каталога и сообщает остальным воркерам об изменении товара.
+    Без product_id сбрасываются только страницы каталога.
+    """
+    payload = str(product_id) if product_id is not None else PRODUCT_CHANGES_ALL
+    await cur.execute(_NOTIFY_PRODUCT_CHANGE, {"channel": PRODUCT_CHANGES_CHANNEL, "payload": payload})
+
+
+@timed_query
+async def _load_catalog_version() -> int:
+    generation = catalog_versions.generation
+    async with get_async_connection() as conn, conn.cursor() as cur:
+        await cur.execute("SELECT COALESCE((SELECT version FROM change_versions WHERE name = 'catalog'), 0)")
+        version = (await cur.fetchone())[0]
+    catalog_versions.update(None, version, generation)
+    return version
+
+
+async def get_catalog_version() -> int:
+    """Версия каталога: из реестра, а после изменения или переподключения — из БД."""
+    version = catalog_versions.get()
+    return version if version is not None else await _load_catalog_version()
+
+
+async def catalog_etag() -> str:
+    return catalog_versions.etag(None, await get_catalog_version())
+
+
+PRODUCT_BY_ID = statement("product_by_id", """
+    SELECT
+        id,
+        name,
+        COALESCE(description, '') as description,
+        cost,
+        CASE
+            WHEN icon_hash IS NOT NULL
+            THEN '/products/' || id || '/icon?v=' || icon_hash
+            ELSE NULL
+        END as icon_url
+    FROM products
+    WHERE id = %(product_id)s
+""")
+
+# Поля, доступные для выборки через fields=, и соответствующие им выражения SQL
+PRODUCT_COLUMNS: Dict[str, str] = {
+    "id": "id",
+    "name": "name",
+    "description": "COALESCE(description, '') as description",
+    "cost": "cost",
+    "icon_url": "CASE WHEN icon_hash IS NOT NULL THEN '/products/' || id || '/icon?v=' || icon_hash ELSE NULL END"
+                " as icon_url"
+}
+
+
+@timed_query
+async def get_all_products(limit: Optional[int] = None,
+                           sort: ProductSort = ProductSort.ID,
+                           after: Optional[Tuple] = None,
+                           min_cost: Optional[int] = None,
+                           max_cost: Optional[int] = None,
+                           fields: Optional[List[str]] = None) -> List[dict]:
+    """
+    Возвращает страницу каталога, упорядоченную по sort (keyset-пагинация).
+    :param after: Ключ последней строки предыдущей страницы: (id,) или (name, id).
+    :param fields: Набор полей из PRODUCT_COLUMNS; id и ключ сортировки выбираются всегда.
+    """
+    read_logger.info("Начало получения продуктов из базы данных: limit=%s, sort=%s", limit, sort.value)
+    columns = [name for name in PRODUCT_COLUMNS if not fields or name in fields or name in ("id", sort.value)]
+    conditions, params = [], []
+    if min_cost is not None:
+        conditions.append("cost >= %s")
+        params.append(min_cost)
+    if max_cost is not None:
+        conditions.append("cost <= %s")
+        params.append(max_cost)
+    if after is not None:
+        if sort == ProductSort.NAME:
+            conditions.append("(name, id) > (%s, %s)")
+        else:
+            conditions.append("id > %s")
+        params.extend(after)
+    params.append(limit)
+
+    cache_key = (limit, sort.value, after, min_cost, max_cost, tuple(columns))
+    cached = catalog_cache.get(cache_key)
+    if cached is not None:
+        return list(cached)
+    generation = catalog_cache.generation
 
-def get_all_products() -> List[Product]:
-    logger.info("Начало получения всех продуктов из базы данных.")
-    conn = None
     try:
-        conn = connect()
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            query = """
-                SELECT 
-                    id, 
-                    name,   
-                    COALESCE(description, '') as description, 
-                    cost,
-                    CASE 
-                        WHEN icon IS NOT NULL 
-                        THEN encode(icon::bytea, 'base64') 
-                        ELSE NULL 
-                    END as icon 
+        async with get_async_connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            # Имена колонок берутся только из PRODUCT_COLUMNS, пользовательские значения передаются параметрами
+            query = f"""
+                SELECT {", ".join(PRODUCT_COLUMNS[name] for name in columns)}
                 FROM products
+                {"WHERE " + " AND ".join(conditions) if conditions else ""}
+                ORDER BY {"name, id" if sort == ProductSort.NAME else "id"}
+                LIMIT %s
             """
-            cur.execute(query)
-            result = cur.fetchall()
-            logger.info("Количество полученных продуктов: %s", len(result))
-            return [Product(**row) for row in result]
+            await cur.execute(query, params)
+            result = await cur.fetchall()
+            read_logger.info("Количество полученных продуктов: %s", len(result))
+            catalog_cache.set(cache_key, result, generation)
+            return list(result)
     except (OperationalError, InterfaceError) as e:
         logger.error("Ошибка соединения: %s", e)
         raise
     except Exception as e:
         logger.error("Ошибка при выполнении запроса: %s", e)
         raise
+
+
+# Поиск: каждое слово запроса ищется и как начало слова (автодополнение), совпадение начала имени
+# поднимается выше остальных. Вариант с pg_trgm дополнительно находит имена с опечатками
+_PRODUCT_SEARCH = """
+    SELECT {columns}
+    FROM products, to_tsquery('russian', %(terms)s) AS query
+    WHERE search_document @@ query{fuzzy_condition}
+    ORDER BY ts_rank(search_document, query)
+                 + CASE WHEN name ILIKE %(prefix)s THEN 1 ELSE 0 END{fuzzy_rank} DESC,
+             id
+    LIMIT %(limit)s OFFSET %(offset)s
+"""
+PRODUCT_SEARCH = statement("product_search", _PRODUCT_SEARCH.format(
+    columns=", ".join(PRODUCT_COLUMNS.values()), fuzzy_condition="", fuzzy_rank=""
+))
+PRODUCT_SEARCH_FUZZY = statement("product_search_fuzzy", _PRODUCT_SEARCH.format(
+    columns=", ".join(PRODUCT_COLUMNS.values()),
+    fuzzy_condition=" OR name %% %(text)s OR name ILIKE %(prefix)s",
+    fuzzy_rank=" + similarity(name, %(text)s)"
+))
+_SEARCH_TERM = re.compile(r"\w+")
+# Установлен ли pg_trgm; проверяется при первом поиске в процессе
+_fuzzy_search: Optional[bool] = None
+
+
+def normalize_search_text(text: str) -> str:
+    """Запрос без различий в регистре и пробелах: ключ кеша и курсора."""
+    return " ".join(text.lower().split())
+
+
+@timed_query
+async def search_products(text: str, limit: int, offset: int = 0) -> List[dict]:
+    """
+    Ищет товары по имени и описанию (полнотекстовый индекс, при наличии pg_trgm — ещё и нечётко
+    по имени) и возвращает страницу, упорядоченную по релевантности.
+    """
+    global _fuzzy_search
+    text = normalize_search_text(text)
+    terms = _SEARCH_TERM.findall(text)
+    if not terms:
+        return []
+
+    cache_key = (text, limit, offset)
+    cached = search_cache.get(cache_key)
+    if cached is not None:
+        return list(cached)
+    generation = search_cache.generation
+
+    read_logger.info("Поиск товаров: %r, limit=%s, offset=%s", text, limit, offset)
+    prefix = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    params = {
+        "terms": " & ".join(f"{term}:*" for term in terms),
+        "text": text,
+        "prefix": prefix,
+        "limit": limit,
+        "offset": offset
+    }
+    try:
+        async with get_async_connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            if _fuzzy_search is None:
+                await cur.execute("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') AS installed")
+                _fuzzy_search = (await cur.fetchone())["installed"]
+            search = PRODUCT_SEARCH_FUZZY if _fuzzy_search else PRODUCT_SEARCH
+            await cur.execute(await prepare_async(cur, search), params)
+            result = await cur.fetchall()
+            search_cache.set(cache_key, result, generation)
+            return list(result)
+    except (OperationalError, InterfaceError) as e:
+        logger.error("Ошибка соединения: %s", e)
+        raise
+    except Exception as e:
+        logger.error("Ошибка при поиске товаров: %s", e)
+        raise
+
+
+async def iter_products(batch_size: int) -> AsyncIterator[List[dict]]:
+    """
+    Отдаёт весь каталог пачками по batch_size строк через серверный курсор (DECLARE/FETCH
+    в транзакции). Соединение асинхронного пула удерживается до конца выгрузки, поэтому число
+    одновременных выгрузок ограничивает вызывающий код.
+    Без timed_query: время между пачками — это передача клиенту, а не работа БД;
+    каждый FETCH замеряется отдельно как iter_products.fetch.
+    """
+    logger.info("Начало выгрузки каталога пачками по %s", batch_size)
+    total = 0
+    try:
+        async with get_async_connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+
+            async def execute(query: str, params: Any = None) -> None:
+                # Имя ставится только на время запроса: между пачками генератор отдаёт управление
+                token = query_name.set("iter_products")
+                try:
+                    await cur.execute(query, params)
+                finally:
+                    query_name.reset(token)
+
+            async with cur.begin():
+                await execute(f"""
+                    DECLARE products_export NO SCROLL CURSOR FOR
+                    SELECT {", ".join(PRODUCT_COLUMNS.values())}
+                    FROM products
+                    ORDER BY id
+                """)
+                while True:
+                    await execute("FETCH FORWARD %s FROM products_export", (batch_size,))
+                    rows = await cur.fetchall()
+                    if not rows:
+                        break
+                    total += len(rows)
+                    yield rows
+        logger.info("Выгрузка каталога завершена, строк: %s", total)
+    except GeneratorExit:
+        logger.info("Выгрузка каталога прервана клиентом после %s строк", total)
+        raise
+    except (OperationalError, InterfaceError) as e:
+        logger.error("Ошибка соединения: %s", e)
+        raise
+    except Exception as e:
+        logger.error("Ошибка при выгрузке каталога: %s", e)
+        raise
+
+
+class _CopySource:
+    """Файлоподобный источник для copy_expert: берёт строки у генератора по мере чтения."""
+
+    def __init__(self, lines: Iterator[str]):
+        self._lines = lines
+        self._buffer = bytearray()
+
+    def read(self, size: int = -1) -> bytes:
+        while size < 0 or len(self._buffer) < size:
+            line = next(self._lines, None)
+            if line is None:
+                break
+            self._buffer += line.encode()
+        if size < 0:
+            size = len(self._buffer)
+        chunk = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return chunk
+
+
+def _copy_text(value: Optional[str]) -> str:
+    """Значение в текстовом формате COPY."""
+    if value is None:
+        return "\\N"
+    return value.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+def _read_import_rows(file: BinaryIO, import_format: ProductImportFormat) -> Iterator[Tuple[int, Any]]:
+    """Отдаёт (номер строки файла, необработанная запись) без чтения файла целиком."""
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    try:
+        if import_format == ProductImportFormat.CSV:
+            reader = csv.DictReader(text)
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for line_number, line in enumerate(text, 1):
+                if line.strip():
+                    yield line_number, line
+    except csv.Error as e:
+        raise ValueError(f"Некорректный CSV: {e}") from e
     finally:
-        if conn:
-            conn.close()
+        # Файл закрывает вызывающий код
+        text.detach()
+
+
+def _parse_import_row(row: Any) -> ProductBase:
+    if isinstance(row, str):
+        row = json.loads(row)
+    if not isinstance(row, dict):
+        raise ValueError("ожидается объект с полями name, description, cost")
+    product = ProductBase(**{field: row.get(field) for field in ProductBase.model_fields})
+    if not product.name.strip():
+        raise ValueError("name: пустое имя товара")
+    if not -2 ** 31 <= product.cost < 2 ** 31:
+        raise ValueError("cost: значение вне допустимого диапазона")
+    return product
+
+
+def _describe_import_error(error: ValueError) -> str:
+    if isinstance(error, ValidationError):
+        return "; ".join(f"{'.'.join(map(str, item['loc']))}: {item['msg']}" for item in error.errors())
+    return str(error)
+
+
+@timed_query
+def import_products(file: BinaryIO, import_format: ProductImportFormat, max_errors: int) -> dict:
+    """
+    Импортирует товары из CSV или NDJSON с полями name, description, cost.
+    Строки проверяются по одной и потоком уходят через COPY во временную таблицу, затем
+    одним запросом сливаются в products по имени (последняя строка с именем побеждает).
+    Память не зависит от размера файла. Строки с ошибками пропускаются и попадают в отчёт.
+    Функция синхронная: COPY доступен только в psycopg2.
+    """
+    logger.info("Начало импорта каталога, формат %s", import_format.value)
+    started = time.monotonic()
+    errors: List[dict] = []
+    counters = {"rows": 0, "failed": 0}
+    read_errors: List[ValueError] = []
+
+    def copy_lines() -> Iterator[str]:
+        rows = _read_import_rows(file, import_format)
+        while True:
+            try:
+                line_number, row = next(rows)
+            except StopIteration:
+                return
+            except ValueError as e:
+                # Файл нечитаем дальше (кодировка, CSV): psycopg2 обернул бы ошибку в свою
+                read_errors.append(e)
+                return
+            try:
+                product = _parse_import_row(row)
+            except ValueError as e:
+                counters["failed"] += 1
+                if len(errors) < max_errors:
+                    errors.append({"line": line_number, "message": _describe_import_error(e)})
+                continue
+            counters["rows"] += 1
+            yield "\t".join((
+                str(line_number),
+                _copy_text(product.name),
+                _copy_text(product.description),
+                str(product.cost)
+            )) + "\n"
+
+    try:
+        with get_connection() as conn, conn.cursor() as cur:
+            cur.execute("""
+                CREATE TEMP TABLE products_import (
+                    line integer,
+                    name text,
+                    description text,
+                    cost integer
+                ) ON COMMIT DROP
+            """)
+            cur.copy_expert("COPY products_import (line, name, description, cost) FROM STDIN", _CopySource(copy_lines()))
+            if read_errors:
+                raise read_errors[0]
+            # Неизменённые товары не переписываются, чтобы не плодить мёртвые версии строк
+            cur.execute("""
+                WITH merged AS (
+                    INSERT INTO products (name, description, cost)
+                    SELECT DISTINCT ON (name) name, description, cost
+                    FROM products_import
+                    ORDER BY name, line DESC
+                    ON CONFLICT (name) DO UPDATE
+                    SET description = EXCLUDED.description,
+                        cost = EXCLUDED.cost
+                    WHERE (products.description, products.cost)
+                        IS DISTINCT FROM (EXCLUDED.description, EXCLUDED.cost)
+                    RETURNING xmax = 0 AS inserted
+                )
+                SELECT
+                    count(*) FILTER (WHERE inserted),
+                    count(*) FILTER (WHERE NOT inserted)
+                FROM merged
+            """)
+            inserted, updated = cur.fetchone()
+            if inserted or updated:
+                cur.execute(_NOTIFY_PRODUCT_CHANGE, {"channel": PRODUCT_CHANGES_CHANNEL,
+                                                     "payload": PRODUCT_CHANGES_RELOAD})
+            conn.commit()
+    except (OperationalError, InterfaceError) as e:
+        logger.error("Ошибка соединения: %s", e)
+        raise
+    except ValueError as e:
+        logger.warning("Файл импорта каталога не прочитан: %s", e)
+        raise
+    except Exception as e:
+        logger.error("Ошибка при импорте каталога: %s", e)
+        raise
+
+    if inserted or updated:
+        product_cache.clear()
+        invalidate_product_cache()
+    duration = time.monotonic() - started
+    processed = counters["rows"] + counters["failed"]
+    logger.info(
+        "Импорт каталога завершён: строк %s, добавлено %s, обновлено %s, ошибок %s, %.2f сек.",
+        processed, inserted, updated, counters["failed"], duration
+    )
+    return {
+        "rows": counters["rows"],
+        "inserted": inserted,
+        "updated": updated,
+        "unchanged": counters["rows"] - inserted - updated,
+        "failed": counters["failed"],
+        "errors": errors,
+        "duration": duration,
+        "rows_per_second": processed / duration if duration else 0.0
+    }
+
 
+@timed_query
+async def get_product(product_id: int) -> Optional[Product]:
+    cached = product_cache.get(product_id)
+    if cached is not None:
+        return cached
+    generation = product_cache.generation
 
-def get_product(product_id: int) -> Optional[Product]:
-    logger.info("Начало получения продукта по ID %s", product_id)
-    conn = None
+    read_logger.info("Начало получения продукта по ID %s", product_id)
     try:
-        conn = connect()
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        async with get_async_connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            await cur.execute(await prepare_async(cur, PRODUCT_BY_ID), {"product_id": product_id})
+            result = await cur.fetchone()
+            read_logger.info("Продукт %s %s", product_id, "найден" if result else "не найден")
+            if not result:
+                return None
+            product = Product(**result)
+            product_cache.set(product_id, product, generation)
+            return product
+    except (OperationalError, InterfaceError) as e:
+        logger.error("Ошибка соединения: %s", e)
+        raise
+    except Exception as e:
+        logger.error("Ошибка при выполнении запроса: %s", e)
+        raise
+
+
+@timed_query
+async def get_product_icon(product_id: int, etag: Optional[str] = None) -> Optional[Tuple[str, Optional[bytes]]]:
+    """
+    Возвращает (хеш иконки, байты иконки) или None, если у товара нет иконки.
+    Если переданный хеш совпадает с текущим, байты не передаются (None).
+    Хеш хранится в генерируемой колонке icon_hash и не пересчитывается при чтении.
+    """
+    read_logger.info("Получение иконки продукта с ID %s", product_id)
+    try:
+        async with get_async_connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
             query = """
                 SELECT 
-                    id, 
-                    name, 
-                    COALESCE(description, '') as description, 
-                    cost,
+                    icon_hash as etag,
                     CASE 
-                        WHEN icon IS NOT NULL 
-                        THEN encode(icon::bytea, 'base64') 
-                        ELSE NULL 
+                        WHEN icon_hash = %s 
+                        THEN NULL 
+                        ELSE icon 
                     END as icon 
                 FROM products 
-                WHERE id = %s
+                WHERE id = %s AND icon_hash IS NOT NULL
             """
-            cur.execute(query, (product_id,))
-            result = cur.fetchone()
-            logger.info("Продукт %s %s", product_id, "найден" if result else "не найден")
-            return Product(**result) if result else None
+            await cur.execute(query, (etag, product_id))
+            result = await cur.fetchone()
+            if not result:
+                return None
+            icon = result['icon']
+            return result['etag'], bytes(icon) if icon is not None else None
     except (OperationalError, InterfaceError) as e:
         logger.error("Ошибка соединения: %s", e)
         raise
     except Exception as e:
-        logger.error("Ошибка при выполнении запроса: %s", e)
+        logger.error("Ошибка при получении иконки: %s", e)
         raise
-    finally:
-        if conn:
-            conn.close()
 
 
-def create_product(product: ProductCreate) -> Product:
+@timed_query
+async def create_product(product: ProductCreate) -> Product:
     logger.info("Начало создания продукта с именем %s", product.name)
-    conn = None
     try:
-        conn = connect()
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        async with get_async_connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
             query = """
                 INSERT INTO products (name, description, cost, icon)
                 VALUES (%s, %s, %s, %s)
@@ -103,10 +578,10 @@ def create_product(product: ProductCreate) -> Product:
                     COALESCE(description, '') as description, 
                     cost,
                     CASE 
-                        WHEN icon IS NOT NULL 
-                        THEN encode(icon::bytea, 'base64') 
+                        WHEN icon_hash IS NOT NULL 
+                        THEN '/products/' || id || '/icon?v=' || icon_hash 
                         ELSE NULL 
-                    END as icon
+                    END as icon_url
             """
             params = (
                 product.name,
@@ -114,37 +589,29 @@ def create_product(product: ProductCreate) -> Product:
                 product.cost,
                 product.icon
             )
-            cur.execute(query, params)
-            conn.commit()
-            result = cur.fetchone()
+            async with cur.begin():
+                await cur.execute(query, params)
+                result = await cur.fetchone()
+                await notify_product_change(cur)
+            invalidate_product_cache()
             logger.info("Продукт успешно создан с ID %s", result['id'])
             return Product(**result)
     except UniqueViolation as e:
         logger.error("Ошибка: имя продукта должно быть уникальным")
-        if conn:
-            conn.rollback()
         raise
     except (OperationalError, InterfaceError) as e:
         logger.error("Ошибка соединения: %s", e)
-        if conn:
-            conn.rollback()
         raise
     except Exception as e:
         logger.error("Ошибка при создании продукта: %s", e)
-        if conn:
-            conn.rollback()
         raise
-    finally:
-        if conn:
-            conn.close()
 
 
-def update_product(product_id: int, product: ProductCreate) -> Optional[Product]:
+@timed_query
+async def update_product(product_id: int, product: ProductCreate) -> Optional[Product]:
     logger.info("Начало обновления продукта с ID %s", product_id)
-    conn = None
     try:
-        conn = connect()
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        async with get_async_connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
             query = """
                 UPDATE products
                 SET name = %s,
@@ -158,10 +625,10 @@ def update_product(product_id: int, product: ProductCreate) -> Optional[Product]
                     COALESCE(description, '') as description, 
                     cost,
                     CASE 
-                        WHEN icon IS NOT NULL 
-                        THEN encode(icon::bytea, 'base64') 
+                        WHEN icon_hash IS NOT NULL 
+                        THEN '/products/' || id || '/icon?v=' || icon_hash 
                         ELSE NULL 
-                    END as icon
+                    END as icon_url
             """
             params = (
                 product.name,
@@ -170,9 +637,12 @@ def update_product(product_id: int, product: ProductCreate) -> Optional[Product]
                 product.icon,
                 product_id
             )
-            cur.execute(query, params)
-            conn.commit()
-            result = cur.fetchone()
+            async with cur.begin():
+                await cur.execute(query, params)
+                result = await cur.fetchone()
+                if result:
+                    await notify_product_change(cur, product_id)
+            invalidate_product_cache(product_id)
             if result:
                 logger.info("Продукт с ID %s успешно обновлен", product_id)
                 return Product(**result)
@@ -181,46 +651,33 @@ def update_product(product_id: int, product: ProductCreate) -> Optional[Product]
                 return None
     except UniqueViolation as e:
         logger.error("Ошибка: имя продукта должно быть уникальным")
-        if conn:
-            conn.rollback()
         raise
     except (OperationalError, InterfaceError) as e:
         logger.error("Ошибка соединения: %s", e)
-        if conn:
-            conn.rollback()
         raise
     except Exception as e:
         logger.error("Ошибка при обновлении продукта: %s", e)
-        if conn:
-            conn.rollback()
         raise
-    finally:
-        if conn:
-            conn.close()
 
 
-def delete_product(product_id: int) -> bool:
+@timed_query
+async def delete_product(product_id: int) -> bool:
     logger.info("Начало удаления продукта с ID %s", product_id)
-    conn = None
     try:
-        conn = connect()
-        with conn.cursor() as cur:
+        async with get_async_connection() as conn, conn.cursor() as cur:
             query = "DELETE FROM products WHERE id = %s"
-            cur.execute(query, (product_id,))
-            conn.commit()
-            deleted = cur.rowcount > 0
+            async with cur.begin():
+                await cur.execute(query, (product_id,))
+                deleted = cur.rowcount > 0
+                if deleted:
+                    await notify_product_change(cur, product_id)
+            if deleted:
+                invalidate_product_cache(product_id)
             logger.info("Продукт с ID %s %sудален", product_id, "" if deleted else "не ")
             return deleted
     except (OperationalError, InterfaceError) as e:
         logger.error("Ошибка соединения: %s", e)
-        if conn:
-            conn.rollback()
         raise
     except Exception as e:
         logger.error("Ошибка при удалении продукта: %s", e)
-        if conn:
-            conn.rollback()
         raise
-    finally:
-        if conn:
-            conn.close()
\ No newline at end of file
@@ -0,0 +1,105 @@
+import re
+import threading
+from typing import Any, Dict, List, Set
+from weakref import WeakKeyDictionary
+
+from ..metrics import metrics
+from ..static import DB_PREPARED_STATEMENTS
+
+__all__: List[str] = [
+    "PreparedStatement",
+    "statement",
+    "statements",
+    "prepare",
+    "prepare_async"
+]
+
+metrics.counter("db_prepared_statements_total", "Запросы, подготовленные на соединениях (PREPARE)")
+metrics.counter("db_prepared_executions_total", "Выполнения подготовленных запросов по имени")
+
+_PARAMETER = re.compile(r"%\((\w+)\)s|%%")
+
+
+class PreparedStatement:
+    """
+    Запрос с именованными параметрами %(name)s. На каждом соединении он один раз готовится
+    (PREPARE с параметрами $1, $2, ...), а дальше выполняется как EXECUTE с тем же словарём
+    параметров, что и исходный SQL.
+    """
+
+    __slots__ = ("name", "sql", "parameters", "prepare_sql", "execute_sql")
+
+    def __init__(self, name: str, sql: str):
+        parameters: List[str] = []
+
+        def placeholder(match: re.Match) -> str:
+            if match.group(1) is None:
+                return "%"
+            if match.group(1) not in parameters:
+                parameters.append(match.group(1))
+            return f"${parameters.index(match.group(1)) + 1}"
+
+        self.name = name
+        self.sql = sql.strip().rstrip(";")
+        self.parameters = parameters
+        self.prepare_sql = f"PREPARE {name} AS {_PARAMETER.sub(placeholder, self.sql)}"
+        arguments = ", ".join(f"%({parameter})s" for parameter in parameters)
+        self.execute_sql = f"EXECUTE {name}({arguments})" if parameters else f"EXECUTE {name}"
+
+
+# Все именованные запросы приложения
+statements: Dict[str, PreparedStatement] = {}
+
+# Имена запросов, уже подготовленных на соединении; запись исчезает вместе с соединением
+_prepared: "WeakKeyDictionary[Any, Set[str]]" = WeakKeyDictionary()
+_prepared_lock = threading.Lock()
+
+
+def statement(name: str, sql: str) -> PreparedStatement:
+    """Регистрирует именованный запрос. Имя общее для всех соединений и должно быть уникальным."""
+    if name in statements:
+        raise ValueError(f"Запрос {name} уже зарегистрирован")
+    statements[name] = PreparedStatement(name, sql)
+    return statements[name]
+
+
+def _unprepared(connection: Any, items: tuple) -> List[PreparedStatement]:
+    with _prepared_lock:
+        prepared = _prepared.setdefault(connection, set())
+        return [item for item in items if item.name not in prepared]
+
+
+def _mark_prepared(connection: Any, item: PreparedStatement) -> None:
+    with _prepared_lock:
+        _prepared[connection].add(item.name)
+    metrics.inc("db_prepared_statements_total", statement=item.name)
+
+
+def _execute_sql(items: tuple) -> str:
+    if not DB_PREPARED_STATEMENTS:
+        return ";\n".join(item.sql for item in items)
+    for item in items:
+        metrics.inc("db_prepared_executions_total", statement=item.name)
+    return ";\n".join(item.execute_sql for item in items)
+
+
+def prepare(cursor: Any, *items: PreparedStatement) -> str:
+    """
+    Готовит на соединении курсора ещё не подготовленные запросы и возвращает SQL, который
+    выполняет их по порядку одним обращением к серверу. Параметры — общий словарь.
+    При DB_PREPARED_STATEMENTS = False возвращает исходный SQL запросов.
+    """
+    if DB_PREPARED_STATEMENTS:
+        for item in _unprepared(cursor.connection, items):
+            cursor.execute(item.prepare_sql)
+            _mark_prepared(cursor.connection, item)
+    return _execute_sql(items)
+
+
+async def prepare_async(cursor: Any, *items: PreparedStatement) -> str:
+    """То же для курсора aiopg."""
+    if DB_PREPARED_STATEMENTS:
+        for item in _unprepared(cursor.connection, items):
+            await cursor.execute(item.prepare_sql)
+            _mark_prepared(cursor.connection, item)
+    return _execute_sql(items)
@@ -1,131 +1,132 @@
-import hashlib
 from logging import Logger
+from typing import Optional
 
 from psycopg2.extras import RealDictCursor
 from psycopg2 import IntegrityError
 
-from .connect import connect
+from .connect import get_connection
+from .statements import statement, prepare
+from ..cache import TTLCache
 from ..logger import configure_logs
+from ..metrics import timed_query
 from ..models.authorization import UserCredentials, UserRole
+from ..static import USER_ID_CACHE_TTL, USER_ID_CACHE_MAX_SIZE
 from ..utils import get_jwt_login
 
 
 logger: Logger = configure_logs(__name__)
-
-
-def insert_user(credentials: UserCredentials) -> bool:
-    connection = connect()
+# Соответствие логина и id пользователя не меняется, поэтому его можно кешировать надолго
+user_id_cache = TTLCache("user_ids", USER_ID_CACHE_MAX_SIZE, USER_ID_CACHE_TTL)
+
+# Поиск пользователя по логину: регистрация, вход и старые токены без user_id
+USER_EXISTS = statement("user_exists", '''
+    SELECT CASE
+               WHEN EXISTS (SELECT 1
+                            FROM users
+                            WHERE username = %(username)s)
+                   THEN true
+               ELSE false
+               END AS is_valid
+''')
+USER_CREDENTIALS = statement("user_credentials", '''
+    SELECT id, password, role
+    FROM users
+    WHERE username = %(username)s
+''')
+USER_ID_BY_USERNAME = statement("user_id_by_username", "SELECT id FROM users WHERE username = %(username)s")
+
+
+@timed_query
+def insert_user(credentials: UserCredentials, password_hash: str) -> int:
+    """Добавляет пользователя с уже вычисленным хешем пароля и возвращает его id."""
     try:
         query = '''
                 INSERT INTO users (username, password, role)
-                VALUES (%s, %s, %s);
+                VALUES (%s, %s, %s)
+                RETURNING id;
                 '''
         params = (
             credentials.username,
-            hashlib.sha256(credentials.password.encode('utf-8')).hexdigest(),
+            password_hash,
             credentials.role.value
         )
 
-        with connection.cursor() as cursor:
+        with get_connection() as connection, connection.cursor() as cursor:
             cursor.execute(query, params)
+            user_id: int = cursor.fetchone()[0]
             connection.commit()
-            return True
+            user_id_cache.set(credentials.username, user_id)
+            return user_id
 
     except Exception as e:
         logger.error("An error excepted while adding user. Error: %s", e)
         raise
-    finally:
-        if connection:
-            connection.close()
-
-
-def get_user_role(username: str) -> UserRole:
-    connection = connect()
-    try:
-        query = "SELECT role FROM users WHERE username = %s"
-        with connection.cursor() as cursor:
-            cursor.execute(query, (username,))
-            result = cursor.fetchone()
-            return UserRole(result[0]) if result else UserRole.USER
-    except Exception as e:
-        logger.error("Error getting user role: %s", e)
-        raise
-    finally:
-        if connection:
-            connection.close()
 
 
+@timed_query
 def identification(username: str) -> bool:
-    connection = connect()
-
     try:
-        query = '''
-                SELECT CASE
-                           WHEN EXISTS (SELECT 1
-                                        FROM users
-                                        WHERE username = %s)
-                               THEN true
-                           ELSE false
-                           END AS is_valid;
-                '''
-
-        with connection.cursor() as cursor:
-            cursor.execute(query, (username,))
+        with get_connection() as connection, connection.cursor() as cursor:
+            cursor.execute(prepare(cursor, USER_EXISTS), {"username": username})
             result: bool = cursor.fetchone()[0]
 
             return result
     except Exception as e:
         logger.error("An error excepted at identification process. Error: %s", e)
         raise
-    finally:
-        if connection:
-            connection.close()
-
 
-def authentication(credentials: UserCredentials) -> bool:
-    connection = connect()
 
+@timed_query
+def get_user_credentials(username: str) -> Optional[dict]:
+    """Одним запросом возвращает id, хеш пароля и роль пользователя (None, если логина нет)."""
     try:
-        query = '''
-                SELECT CASE
-                           WHEN EXISTS (SELECT 1
-                                        FROM users
-                                        WHERE username = %s
-                                          AND password = %s)
-                               THEN true
-                           ELSE false
-                           END AS is_valid;
-                '''
-
-        with connection.cursor() as cursor:
-            cursor.execute(query,
-                           (credentials.username, hashlib.sha256(credentials.password.encode('utf-8')).hexdigest()))
-            result: bool = cursor.fetchone()[0]
+        with get_connection() as connection, connection.cursor(cursor_factory=RealDictCursor) as cursor:
+            cursor.execute(prepare(cursor, USER_CREDENTIALS), {"username": username})
+            result = cursor.fetchone()
+            if not result:
+                return None
 
-            return result
+            user_id_cache.set(username, result['id'])
+            return {
+                'id': result['id'],
+                'password': result['password'],
+                'role': UserRole(result['role']) if result['role'] else UserRole.USER
+            }
 
     except Exception as e:
         logger.error("An error excepted at authentication process. Error: %s", e)
         raise
-    finally:
-        if connection:
-            connection.close()
 
+
+@timed_query
+def update_password_hash(user_id: int, password_hash: str) -> None:
+    """Заменяет хеш пароля, например при переходе со старой схемы хеширования."""
+    try:
+        with get_connection() as connection, connection.cursor() as cursor:
+            cursor.execute("UPDATE users SET password = %s WHERE id = %s", (password_hash, user_id))
+            connection.commit()
+    except Exception as e:
+        logger.error("An error excepted while updating password hash. Error: %s", e)
+        raise
+
+
+@timed_query
 def get_user_id_by_username(username: str) -> int:
-    connection = connect()
+    """Нужен только для токенов, выданных до появления в них user_id."""
+    cached = user_id_cache.get(username)
+    if cached is not None:
+        return cached
     try:
-        with connection.cursor(cursor_factory=RealDictCursor) as cursor:
-            cursor.execute("SELECT id FROM users WHERE username = %s", (username,))
+        with get_connection() as connection, connection.cursor(cursor_factory=RealDictCursor) as cursor:
+            cursor.execute(prepare(cursor, USER_ID_BY_USERNAME), {"username": username})
             result = cursor.fetchone()
             if not result:
                 raise ValueError("Пользователь не найден")
+            user_id_cache.set(username, result['id'])
             return result['id']
     except Exception as e:
-        logger.error(f"Ошибка получения user_id: {e}")
+        logger.error("Ошибка получения user_id: %s", e)
         raise
-    finally:
-        if connection:
-            connection.close()
 
 def get_user_profile(authorization: str) -> dict:
     """Получение профиля пользователя с фиктивными данными"""
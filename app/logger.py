@@ -1,8 +1,21 @@
 """Файл для настройки логирования."""
+import atexit
 import os
+import queue
+import random
 import sys
 import logging
-from logging.handlers import RotatingFileHandler
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from contextvars import ContextVar
+from typing import Dict, List, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: межпроцессная блокировка ротации недоступна
+    fcntl = None
+
+from .static import LOG_QUEUE_SIZE
 
 
 def create_intermediate_dirs(path: str) -> None:
@@ -20,38 +33,189 @@ def create_intermediate_dirs(path: str) -> None:
         print(f"Ошибка при создании директорий: {e}")
 
 
-def configure_logs(name: str, logs_path: str = "logs/app.log", log_level: int = logging.INFO) -> logging.Logger:
+class SharedRotatingFileHandler(RotatingFileHandler):
+    """
+    RotatingFileHandler для файла, в который пишут несколько процессов-воркеров.
+    Ротация выполняется под межпроцессной блокировкой (flock). Процесс, чей файл
+    уже переименовал другой воркер, не ротирует повторно, а открывает файл заново.
+    """
+
+    def _rotated_elsewhere(self) -> bool:
+        try:
+            return os.stat(self.baseFilename).st_ino != os.fstat(self.stream.fileno()).st_ino
+        except OSError:
+            return True
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        if self.stream is not None and self._rotated_elsewhere():
+            self.stream.close()
+            self.stream = self._open()
+        return super().shouldRollover(record)
+
+    def doRollover(self) -> None:
+        if fcntl is None:
+            super().doRollover()
+            return
+        with open(self.baseFilename + ".lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                if self.stream is not None and self._rotated_elsewhere():
+                    self.stream.close()
+                    self.stream = self._open()
+                else:
+                    super().doRollover()
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Передаёт записи фоновому потоку записи. Сообщение не форматируется в вызывающем потоке,
+    а при переполненной очереди запись отбрасывается: логирование не ждёт диска.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Очередь внутри процесса: запись не нужно сериализовать, форматирует поток записи
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class InfoSampler(logging.Filter):
+    """Пропускает только долю rate записей уровня INFO и ниже; предупреждения и ошибки — все."""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno > logging.INFO or random.random() < self.rate
+
+
+LOG_FORMAT = '%(asctime)s %(levelname)s [%(module)s] %(request_id)s: %(message)s'
+
+# id текущего запроса, подставляется во все записи (заполняет middleware запросов)
+request_id: ContextVar[str] = ContextVar("request_id", default="-")
+
+
+class RequestIdFilter(logging.Filter):
+    """Запоминает id запроса в записи, пока она ещё в потоке, который её создал."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id.get()
+        return True
+
+
+_lock = threading.Lock()
+# Обработчик очереди и поток записи для каждого файла логов
+_writers: Dict[str, Tuple[NonBlockingQueueHandler, QueueListener]] = {}
+# Настроенные логгеры и их файлы, чтобы заменить обработчики после fork
+_loggers: Dict[str, Tuple[logging.Logger, str]] = {}
+_formats: Dict[str, Tuple[str, bool]] = {}
+
+
+def _start_writer(logs_path: str, log_format: str, console: bool) -> NonBlockingQueueHandler:
+    create_intermediate_dirs(path=logs_path)
+    formatter = logging.Formatter(log_format)
+    # Файл логов с максимальным размером 50 МБ и 3 резервными копиями
+    file_handler = SharedRotatingFileHandler(
+        logs_path,
+        mode='a',
+        maxBytes=50 * 1024 * 1024,  # 50 МБ
+        backupCount=3,
+        encoding='utf-8'
+    )
+    file_handler.setFormatter(formatter)
+    handlers: List[logging.Handler] = [file_handler]
+    if console:
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setFormatter(formatter)
+        handlers.append(console_handler)
+
+    log_queue: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    handler = NonBlockingQueueHandler(log_queue)
+    handler.addFilter(RequestIdFilter())
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    _writers[logs_path] = (handler, listener)
+    _formats[logs_path] = (log_format, console)
+    return handler
+
+
+def _get_handler(logs_path: str, log_format: str, console: bool) -> NonBlockingQueueHandler:
+    """
+    Один поток записи на файл логов в процессе: логгеры ставят записи в общую очередь,
+    а файл (и консоль) обслуживает QueueListener.
+    """
+    with _lock:
+        writer = _writers.get(logs_path)
+        if writer is not None:
+            return writer[0]
+        return _start_writer(logs_path, log_format, console)
+
+
+def _restart_after_fork() -> None:
+    """В дочернем процессе потоков записи нет: создаём их заново и меняем обработчики логгеров."""
+    global _lock
+    _lock = threading.Lock()
+    stale = {path: handler for path, (handler, _) in _writers.items()}
+    _writers.clear()
+    for path, handler in stale.items():
+        _start_writer(path, *_formats[path])
+    for logger, path in _loggers.values():
+        logger.removeHandler(stale[path])
+        logger.addHandler(_writers[path][0])
+
+
+def stop_logging() -> None:
+    """Дописывает оставшиеся в очередях записи и останавливает потоки записи."""
+    with _lock:
+        for _, listener in _writers.values():
+            listener.stop()
+        _writers.clear()
+
+
+def dropped_log_records() -> int:
+    """Сколько записей отброшено из-за переполнения очередей."""
+    return sum(handler.dropped for handler, _ in _writers.values())
+
+
+atexit.register(stop_logging)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_after_fork)
+
+
+def configure_logs(name: str, logs_path: str = "logs/app.log", log_level: int = logging.INFO,
+                   sample_rate: float = 1.0, log_format: str = LOG_FORMAT, console: bool = True) -> logging.Logger:
     """
     Настраивает вывод и сохранение логов в файл и вывод в консоль.
+    Запись выполняет фоновый поток, вызов логгера только ставит запись в очередь.
     :param name: Название файла, в котором создаётся логгер.
     :param log_level: Урень логирования, стандартное значение INFO.
     :param logs_path: Путь к файлу с логами.
+    :param sample_rate: Доля сохраняемых записей INFO (для горячих путей).
+    :param log_format: Формат записей; для файла действует формат первого логгера.
+    :param console: Дублировать ли записи в консоль.
     """
-    # Получаем корневой логгер
     logger = logging.getLogger(name=name)
     logger.setLevel(log_level)
 
     # Проверяем, есть ли уже обработчики, чтобы избежать добавления дубликатов
     if not logger.handlers:
-        create_intermediate_dirs(path=logs_path)
-        # Настройка RotatingFileHandler для файла логов с максимальным размером 50 МБ и 3 резервными копиями
-        file_handler = RotatingFileHandler(
-          logs_path,
-          mode='a',
-          maxBytes=50 * 1024 * 1024,  # 50 МБ
-          backupCount=3,
-          encoding='utf-8'
-        )
-        file_handler.setLevel(log_level)
-        file_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s [%(module)s]: %(message)s'))
-
-        # Добавляем обработчик для консоли
-        console_handler = logging.StreamHandler(sys.stdout)
-        console_handler.setLevel(log_level)
-        console_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s [%(module)s]: %(message)s'))
-
-        logger.addHandler(file_handler)
-        logger.addHandler(console_handler)
+        logger.addHandler(_get_handler(logs_path, log_format, console))
+        # Записи уже попадают в общую очередь, родительским логгерам их не передаём
+        logger.propagate = False
+        _loggers[name] = (logger, logs_path)
+        if sample_rate < 1:
+            logger.addFilter(InfoSampler(sample_rate))
 
     return logger
 
@@ -1,19 +1,67 @@
+import logging
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from .routers import authorization, product, cart, user  # Добавляем импорт cart
+from .routers import authorization, product, cart, user, metrics as metrics_router  # Добавляем импорт cart
+from .database.connect import get_pool, close_pool, get_async_pool, close_async_pool
+from .database.executor import db_executor, run_sync
+from .database.migrations import migrate, check_schema, SchemaVersionError
+from .database.notifications import change_listener
+from .passwords import shutdown_password_pool
+from .metrics import metrics
+from .static import DB_MIGRATE_ON_STARTUP
+from .timing import TimingMiddleware
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    try:
+        # Заранее открываем минимальное число соединений пула
+        get_pool().fill()
+        await get_async_pool()
+    except Exception as e:
+        logging.warning("Не удалось прогреть пул соединений: %s", e)
+    if DB_MIGRATE_ON_STARTUP:
+        try:
+            await run_sync(migrate)
+        except Exception as e:
+            logging.error("Не удалось применить миграции: %s", e)
+    try:
+        # Старая схема останавливает запуск: запросы обращаются к новым столбцам и таблицам.
+        # Отсутствующие индексы только в журнале: приложение работает и без них, но медленнее
+        await run_sync(check_schema, True)
+    except SchemaVersionError:
+        raise
+    except Exception as e:
+        logging.warning("Не удалось проверить схему БД: %s", e)
+    change_listener.start()
+    metrics.start()
+    yield
+    await metrics.stop()
+    await change_listener.stop()
+    await close_async_pool()
+    db_executor.shutdown()
+    shutdown_password_pool()
+    close_pool()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
-    allow_headers=["*"]
+    allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "X-Request-ID", "Server-Timing"]
 )
+# Добавлен последним, поэтому внешний: время включает все остальные middleware
+app.add_middleware(TimingMiddleware)
 
 app.include_router(authorization.router)
 app.include_router(product.router)
 app.include_router(cart.router)
 
-app.include_router(user.router)# Регистрируем роутер корзины
\ No newline at end of file
+app.include_router(user.router)# Регистрируем роутер корзины
+app.include_router(metrics_router.router)
@@ -0,0 +1,320 @@
+"""Метрики в текстовом формате Prometheus, общие для всех процессов-воркеров."""
+import asyncio
+import bisect
+import functools
+import inspect
+import json
+import os
+import secrets
+import threading
+import time
+from contextvars import ContextVar
+from logging import Logger
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, TypeVar
+
+from .logger import configure_logs
+from .static import METRICS_DIR, METRICS_FLUSH_INTERVAL
+
+__all__: List[str] = [
+    "MetricsRegistry",
+    "metrics",
+    "query_name",
+    "timed_query"
+]
+logger: Logger = configure_logs(__name__)
+F = TypeVar("F", bound=Callable[..., Any])
+
+Labels = Tuple[Tuple[str, str], ...]
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in items) + "}"
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class MetricsRegistry:
+    """
+    Метрики процесса-воркера. Каждый воркер периодически сохраняет снимок в общий каталог,
+    а /metrics складывает снимки всех воркеров: счётчики и гистограммы — в том числе
+    завершившихся процессов (чтобы значения не убывали), gauge — только живых.
+    Каталог стоит очищать при перезапуске всего сервиса.
+    """
+
+    def __init__(self, directory: str, flush_interval: float):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        # имя -> (тип, описание, границы гистограммы)
+        self._metadata: Dict[str, Tuple[str, str, Tuple[float, ...]]] = {}
+        # имя -> (числитель, знаменатели): доли, вычисляемые после сложения по воркерам
+        self._ratios: Dict[str, Tuple[str, Tuple[str, ...]]] = {}
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        self._gauges: Dict[Tuple[str, Labels], float] = {}
+        # количество наблюдений в каждом интервале (последний — +Inf) и сумма
+        self._histograms: Dict[Tuple[str, Labels], List[float]] = {}
+        self._collectors: List[Callable[["MetricsRegistry"], None]] = []
+        self._file: Optional[str] = None
+        self._file_pid: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def counter(self, name: str, description: str) -> None:
+        self._metadata[name] = ("counter", description, ())
+
+    def gauge(self, name: str, description: str) -> None:
+        self._metadata[name] = ("gauge", description, ())
+
+    def histogram(self, name: str, description: str, buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        self._metadata[name] = ("histogram", description, tuple(buckets))
+
+    def ratio(self, name: str, description: str, numerator: str, denominators: Sequence[str]) -> None:
+        """Доля numerator / сумма denominators по одинаковым меткам, считается после агрегации."""
+        self._metadata[name] = ("gauge", description, ())
+        self._ratios[name] = (numerator, tuple(denominators))
+
+    def inc(self, name: str, value: float = 1.0, **labels: Any) -> None:
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def set_total(self, name: str, value: float, **labels: Any) -> None:
+        """Устанавливает счётчик, который процесс уже считает сам (статистика пулов и кешей)."""
+        with self._lock:
+            self._counters[(name, _labels(labels))] = value
+
+    def set(self, name: str, value: float, **labels: Any) -> None:
+        with self._lock:
+            self._gauges[(name, _labels(labels))] = value
+
+    def add(self, name: str, delta: float, **labels: Any) -> None:
+        key = (name, _labels(labels))
+        with self._lock:
+            self._gauges[key] = self._gauges.get(key, 0.0) + delta
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        buckets = self._metadata[name][2]
+        key = (name, _labels(labels))
+        with self._lock:
+            data = self._histograms.get(key)
+            if data is None:
+                data = self._histograms[key] = [0.0] * (len(buckets) + 2)
+            data[bisect.bisect_left(buckets, value)] += 1
+            data[-1] += value
+
+    def add_collector(self, collector: Callable[["MetricsRegistry"], None]) -> None:
+        """collector вызывается перед каждым снимком и переносит в метрики текущие статистики."""
+        self._collectors.append(collector)
+
+    def snapshot(self) -> Dict[str, Any]:
+        for collector in self._collectors:
+            try:
+                collector(self)
+            except Exception as e:
+                logger.warning("Ошибка сбора метрик: %s", e)
+        with self._lock:
+            return {
+                "pid": os.getpid(),
+                "counters": [[name, labels, value] for (name, labels), value in self._counters.items()],
+                "gauges": [[name, labels, value] for (name, labels), value in self._gauges.items()],
+                "histograms": [[name, labels, list(data)] for (name, labels), data in self._histograms.items()]
+            }
+
+    def flush(self) -> None:
+        """Сохраняет снимок метрик процесса в общий каталог."""
+        pid = os.getpid()
+        if self._file is None or self._file_pid != pid:
+            os.makedirs(self.directory, exist_ok=True)
+            self._file = os.path.join(self.directory, f"{pid}-{secrets.token_hex(4)}.json")
+            self._file_pid = pid
+        temporary = f"{self._file}.tmp"
+        with open(temporary, "w", encoding="utf-8") as file:
+            json.dump(self.snapshot(), file)
+        os.replace(temporary, self._file)
+
+    def _read_snapshots(self) -> List[Tuple[str, Dict[str, Any]]]:
+        snapshots = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                with open(path, encoding="utf-8") as file:
+                    snapshots.append((path, json.load(file)))
+            except (OSError, ValueError) as e:
+                logger.warning("Снимок метрик %s не прочитан: %s", name, e)
+        return snapshots
+
+    def collect(self) -> str:
+        """Метрики всех воркеров в текстовом формате Prometheus."""
+        self.flush()
+        values: Dict[str, Dict[Labels, float]] = {}
+        histograms: Dict[str, Dict[Labels, List[float]]] = {}
+        own_pid = os.getpid()
+        for path, snapshot in self._read_snapshots():
+            # Файл с нашим pid, но не наш, остался от прежнего процесса
+            alive = path == self._file or (snapshot["pid"] != own_pid and _process_alive(snapshot["pid"]))
+            series = snapshot["counters"] + (snapshot["gauges"] if alive else [])
+            for name, labels, value in series:
+                metric = values.setdefault(name, {})
+                key = tuple(map(tuple, labels))
+                metric[key] = metric.get(key, 0.0) + value
+            for name, labels, data in snapshot["histograms"]:
+                metric = histograms.setdefault(name, {})
+                key = tuple(map(tuple, labels))
+                total = metric.get(key)
+                if total is None or len(total) != len(data):
+                    metric[key] = list(data)
+                else:
+                    metric[key] = [a + b for a, b in zip(total, data)]
+
+        for name, (numerator, denominators) in self._ratios.items():
+            metric = values[name] = {}
+            for labels, value in values.get(numerator, {}).items():
+                total = sum(values.get(denominator, {}).get(labels, 0.0) for denominator in denominators)
+                metric[labels] = value / total if total else 0.0
+
+        lines = []
+        for name, (metric_type, description, buckets) in self._metadata.items():
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            if metric_type == "histogram":
+                for labels, data in sorted(histograms.get(name, {}).items()):
+                    cumulative = 0.0
+                    for bound, count in zip(buckets + (float("inf"),), data):
+                        cumulative += count
+                        le = "+Inf" if bound == float("inf") else _format_value(bound)
+                        lines.append(f"{name}_bucket{_format_labels(labels, ('le', le))} {_format_value(cumulative)}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(data[-1])}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {_format_value(cumulative)}")
+            else:
+                for labels, value in sorted(values.get(name, {}).items()):
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="metrics-flush")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning("Не удалось сохранить снимок метрик: %s", e)
+
+
+metrics = MetricsRegistry(METRICS_DIR, METRICS_FLUSH_INTERVAL)
+
+metrics.counter("http_requests_total", "Обработанные HTTP-запросы")
+metrics.histogram("http_request_duration_seconds", "Время обработки HTTP-запроса")
+metrics.gauge("http_requests_in_flight", "HTTP-запросы в обработке")
+metrics.counter("http_exceptions_total", "Необработанные исключения по типу")
+metrics.histogram("db_query_duration_seconds", "Время функций доступа к БД", DB_BUCKETS)
+metrics.counter("db_errors_total", "Ошибки функций доступа к БД по типу исключения")
+
+
+# Имя выполняемой функции доступа к БД, им подписываются отдельные SQL-запросы
+query_name: ContextVar[str] = ContextVar("query_name", default="unnamed")
+
+
+def timed_query(func: F) -> F:
+    """Замеряет время функции доступа к БД (обычной, async или генератора) под её именем."""
+    name = func.__name__
+
+    def record(started: float, error: Optional[BaseException]) -> None:
+        metrics.observe("db_query_duration_seconds", time.perf_counter() - started, query=name)
+        if error is not None:
+            metrics.inc("db_errors_total", query=name, exception=type(error).__name__)
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+            started = time.perf_counter()
+            token = query_name.set(name)
+            try:
+                result = await func(*args, **kwargs)
+            except Exception as e:
+                record(started, e)
+                raise
+            finally:
+                query_name.reset(token)
+            record(started, None)
+            return result
+        return async_wrapper
+
+    if inspect.isgeneratorfunction(func):
+        @functools.wraps(func)
+        def generator_wrapper(*args: Any, **kwargs: Any) -> Any:
+            started = time.perf_counter()
+            generator = func(*args, **kwargs)
+            try:
+                while True:
+                    # Шаги генератора могут выполняться в разных контекстах (потоках),
+                    # поэтому имя устанавливается и сбрасывается на каждом шаге
+                    token = query_name.set(name)
+                    try:
+                        item = next(generator)
+                    except StopIteration:
+                        break
+                    finally:
+                        query_name.reset(token)
+                    yield item
+            except Exception as e:
+                record(started, e)
+                raise
+            finally:
+                generator.close()
+            record(started, None)
+        return generator_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        started = time.perf_counter()
+        token = query_name.set(name)
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            record(started, e)
+            raise
+        finally:
+            query_name.reset(token)
+        record(started, None)
+        return result
+    return wrapper
@@ -12,9 +12,11 @@ class CartBase(BaseModel):
 class CartCreate(CartBase):
     pass
 
-class Cart(CartBase):
+class CartItem(CartBase):
     id: int
     user_id: int
+
+class Cart(CartItem):
     name: str  # Из таблицы products
     cost: int  # Из таблицы products
-    icon: Optional[str] = None
+    icon_url: Optional[str] = None  # GET /products/{id}/icon
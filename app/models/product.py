@@ -1,17 +1,49 @@
-from pydantic import BaseModel
-from typing import Optional
+from enum import Enum
+from pydantic import Base64Bytes, BaseModel
+from typing import List, Optional
 
 
 class ProductBase(BaseModel):
     name: str
     description: Optional[str] = None
     cost: int
-    icon: Optional[bytes] = None
 
 
 class ProductCreate(ProductBase):
-    pass
+    icon: Optional[Base64Bytes] = None  # Файл изображения в base64
 
 
 class Product(ProductBase):
     id: int
+    icon_url: Optional[str] = None  # Иконка отдаётся отдельно: GET /products/{id}/icon
+
+
+class ProductSort(str, Enum):
+    ID = "id"
+    NAME = "name"
+
+
+class ProductExportFormat(str, Enum):
+    NDJSON = "ndjson"
+    JSON = "json"
+
+
+class ProductImportFormat(str, Enum):
+    CSV = "csv"
+    NDJSON = "ndjson"
+
+
+class ProductImportError(BaseModel):
+    line: int
+    message: str
+
+
+class ProductImportResult(BaseModel):
+    rows: int  # Строк прошло проверку и загружено во временную таблицу
+    inserted: int
+    updated: int
+    unchanged: int  # Совпали с каталогом или повторяют имя ниже по файлу
+    failed: int
+    errors: List[ProductImportError]  # Первые PRODUCTS_IMPORT_MAX_ERRORS ошибок
+    duration: float
+    rows_per_second: float
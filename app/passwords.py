@@ -0,0 +1,64 @@
+"""Хеширование паролей в отдельном пуле процессов."""
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+from passlib.context import CryptContext
+
+from .static import PASSWORD_SCHEMES, PASSWORD_BCRYPT_ROUNDS, PASSWORD_HASH_WORKERS
+
+__all__: List[str] = [
+    "password_context",
+    "hash_password",
+    "verify_password",
+    "shutdown_password_pool"
+]
+
+# Первая схема используется для новых хешей, остальные считаются устаревшими:
+# такие хеши (например, старый несолёный hex_sha256) заменяются при следующем входе
+password_context = CryptContext(
+    schemes=PASSWORD_SCHEMES,
+    deprecated="auto",
+    bcrypt__rounds=PASSWORD_BCRYPT_ROUNDS
+)
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _hash(password: str) -> str:
+    return password_context.hash(password)
+
+
+def _verify(password: str, password_hash: str) -> Tuple[bool, Optional[str]]:
+    return password_context.verify_and_update(password, password_hash)
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn, а не fork: воркер uvicorn к этому моменту уже многопоточный
+        _pool = ProcessPoolExecutor(
+            max_workers=PASSWORD_HASH_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _pool
+
+
+async def hash_password(password: str) -> str:
+    return await asyncio.get_running_loop().run_in_executor(_get_pool(), _hash, password)
+
+
+async def verify_password(password: str, password_hash: str) -> Tuple[bool, Optional[str]]:
+    """
+    Проверяет пароль. Возвращает (верен ли пароль, новый хеш),
+    новый хеш не None, если сохранённый нужно перехешировать текущей схемой.
+    """
+    return await asyncio.get_running_loop().run_in_executor(_get_pool(), _verify, password, password_hash)
+
+
+def shutdown_password_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+    _pool = None
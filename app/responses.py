@@ -0,0 +1,28 @@
+"""Быстрая отдача JSON: строки из БД кодируются сразу в байты, без повторной проверки моделей."""
+from typing import Any, List
+
+import orjson
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+__all__: List[str] = [
+    "FastJSONResponse"
+]
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    raise TypeError(f"Тип {type(value).__name__} не сериализуется в JSON")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse с кодированием через orjson. Обработчик, который её возвращает, обходит
+    проверку по response_model, поэтому содержимое уже должно ей соответствовать: строки
+    запросов, где типы и NOT NULL/COALESCE колонок совпадают с моделью ответа.
+    response_model в декораторе остаётся для схемы OpenAPI.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=_default)
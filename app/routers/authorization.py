@@ -4,7 +4,9 @@ from fastapi import APIRouter, status
 from fastapi.responses import JSONResponse
 from psycopg2 import errors
 
-from ..database.user import identification, authentication, insert_user, get_user_role
+from ..database.executor import run_sync
+from ..database.user import identification, insert_user, get_user_credentials, update_password_hash
+from ..passwords import hash_password, verify_password
 from ..utils import create_jwt
 from ..models.authorization import UserCredentials
 
@@ -15,18 +17,19 @@ router = APIRouter(
 
 
 @router.post("/registration")
-def registration(credentials: UserCredentials) -> JSONResponse:
+async def registration(credentials: UserCredentials) -> JSONResponse:
     try:
-        if identification(credentials.username):
+        if await run_sync(identification, credentials.username):
             return JSONResponse(content={'message': 'Такой логин уже зарегистрирован'},
                                 status_code=status.HTTP_409_CONFLICT)
 
-        insert_user(credentials)
+        password_hash = await hash_password(credentials.password)
+        user_id = await run_sync(insert_user, credentials, password_hash)
 
         return JSONResponse(
             content={
                 'message': 'Пользователь успешно зарегистрирован',
-                'token': create_jwt(credentials.username, credentials.role),
+                'token': create_jwt(credentials.username, credentials.role, user_id),
                 'role': 0b10
             },
             status_code=status.HTTP_201_CREATED
@@ -41,28 +44,34 @@ def registration(credentials: UserCredentials) -> JSONResponse:
 
 
 @router.post("/login")
-def login(credentials: UserCredentials) -> JSONResponse:
+async def login(credentials: UserCredentials) -> JSONResponse:
     try:
-        if not identification(credentials.username):
+        user = await run_sync(get_user_credentials, credentials.username)
+        if not user:
             return JSONResponse(content={'message': 'Не существует пользователя с таким логином'},
                                 status_code=status.HTTP_401_UNAUTHORIZED)
 
-        if not authentication(credentials):
+        valid, new_hash = await verify_password(credentials.password, user['password'])
+        if not valid:
             return JSONResponse(content={'valid': False,
                                          'message': 'Не правильный пароль'},
                                 status_code=status.HTTP_401_UNAUTHORIZED)
 
-        # Получаем роль пользователя из БД
-        user_role = get_user_role(credentials.username)
+        if new_hash:
+            # Хеш старой схемы заменяется при успешном входе; ошибка здесь не мешает войти
+            try:
+                await run_sync(update_password_hash, user['id'], new_hash)
+            except Exception as e:
+                logging.error(e)
 
         return JSONResponse(
             content={
                 'message': 'Успешный вход',
-                'token': create_jwt(credentials.username, user_role)
+                'token': create_jwt(credentials.username, user['role'], user['id'])
             },
             status_code=status.HTTP_200_OK
         )
     except Exception as e:
         logging.error(e)
         return JSONResponse(content={'message': 'Ошибка сервера'},
-                            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+                            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -1,13 +1,26 @@
 # [file name]: routers/cart.py
-from fastapi import APIRouter, Header, status, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Body, Header, status, HTTPException
+from fastapi.responses import JSONResponse, Response
 import logging
-from typing import List
+from typing import List, Optional
 
-from ..utils import get_jwt_login, verify_jwt
+from psycopg2 import errors
+
+from ..responses import FastJSONResponse
+from ..utils import get_jwt_payload, verify_jwt, etag_matches
 from ..models.cart import CartUpdate, Cart
-from ..database.cart import get_user_cart, update_cart_item, clear_user_cart, update_cart_item_amount
+from ..database.cart import (
+    cart_versions,
+    cart_etag,
+    get_user_cart,
+    update_cart_item,
+    update_cart_items,
+    clear_user_cart,
+    update_cart_item_amount
+)
 from ..database.user import get_user_id_by_username
+from ..database.executor import run_sync
+from ..static import CART_BATCH_MAX_ITEMS
 
 router = APIRouter(
     prefix="/cart",
@@ -15,15 +28,31 @@ router = APIRouter(
 )
 logger = logging.getLogger(__name__)
 
+
+async def get_user_id(authorization: str) -> int:
+    """id пользователя из проверенного токена; для старых токенов без user_id — по логину."""
+    payload = get_jwt_payload(authorization)
+    user_id = payload.get("user_id")
+    if isinstance(user_id, int):
+        return user_id
+    return await run_sync(get_user_id_by_username, payload["username"])
+
+
 @router.get("", response_model=List[Cart])
 @verify_jwt
-async def get_cart(authorization: str = Header(...)):
+async def get_cart(authorization: str = Header(...), if_none_match: Optional[str] = Header(None)):
     try:
-        username = get_jwt_login(authorization)
-        user_id = get_user_id_by_username(username)
-        return get_user_cart(user_id)
+        user_id = await get_user_id(authorization)
+        # Версию берём до чтения: изменение во время запроса даст новый ETag при следующем
+        etag = await cart_etag(user_id)
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if cart_versions.enabled and etag_matches(if_none_match, etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        # Строки корзины уже соответствуют Cart и кодируются без повторной проверки
+        return FastJSONResponse(content=await get_user_cart(user_id), headers=headers)
     except Exception as e:
-        logger.error(f"Ошибка получения корзины: {str(e)}")
+        logger.error("Ошибка получения корзины: %s", e)
         return JSONResponse(
             content={"message": "Ошибка получения корзины"},
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -36,11 +65,32 @@ async def update_cart(
     authorization: str = Header(...)
 ):
     try:
-        username = get_jwt_login(authorization)
-        user_id = get_user_id_by_username(username)
-        return update_cart_item(user_id, cart_data.product_id, cart_data.amount)
+        user_id = await get_user_id(authorization)
+        return await update_cart_item(user_id, cart_data.product_id, cart_data.amount)
+    except Exception as e:
+        logger.error("Ошибка обновления корзины: %s", e)
+        return JSONResponse(
+            content={"message": "Ошибка обновления корзины"},
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+@router.post("/batch", response_model=List[Cart])
+@verify_jwt
+async def update_cart_batch(
+    items: List[CartUpdate] = Body(..., max_length=CART_BATCH_MAX_ITEMS),
+    authorization: str = Header(...)
+):
+    try:
+        user_id = await get_user_id(authorization)
+        return await update_cart_items(user_id, items)
+    except errors.ForeignKeyViolation:
+        return JSONResponse(
+            content={"message": "Товар не найден"},
+            status_code=status.HTTP_404_NOT_FOUND
+        )
     except Exception as e:
-        logger.error(f"Ошибка обновления корзины: {str(e)}")
+        logger.error("Ошибка пакетного обновления корзины: %s", e)
         return JSONResponse(
             content={"message": "Ошибка обновления корзины"},
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -54,10 +104,10 @@ async def update_cart_amount(
     authorization: str = Header(...)
 ):
     try:
-        user_id = get_user_id_by_username(get_jwt_login(authorization))
-        return update_cart_item_amount(user_id, cart_data.product_id, cart_data.amount)
+        user_id = await get_user_id(authorization)
+        return await update_cart_item_amount(user_id, cart_data.product_id, cart_data.amount)
     except Exception as e:
-        logger.error(f"Ошибка обновления корзины: {str(e)}")
+        logger.error("Ошибка обновления корзины: %s", e)
         return JSONResponse(
             content={"message": "Ошибка обновления корзины"},
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -68,11 +118,10 @@ async def update_cart_amount(
 @verify_jwt
 async def clear_cart(authorization: str = Header(...)):
     try:
-        username = get_jwt_login(authorization)
-        user_id = get_user_id_by_username(username)
-        clear_user_cart(user_id)
+        user_id = await get_user_id(authorization)
+        await clear_user_cart(user_id)
     except Exception as e:
-        logger.error(f"Ошибка очистки корзины: {str(e)}")
+        logger.error("Ошибка очистки корзины: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Ошибка очистки корзины"
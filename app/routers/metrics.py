@@ -0,0 +1,68 @@
+from fastapi import APIRouter
+from fastapi.responses import Response
+
+from ..cache import caches
+from ..database.connect import pool_stats
+from ..database.executor import db_executor
+from ..database.notifications import change_listener
+from ..logger import dropped_log_records
+from ..metrics import MetricsRegistry, metrics
+
+router = APIRouter(tags=["Метрики"])
+
+metrics.gauge("db_pool_connections", "Соединения пула по состоянию")
+metrics.gauge("db_pool_max_size", "Максимальный размер пула")
+metrics.gauge("db_pool_waiting", "Потоки, ожидающие соединения синхронного пула")
+metrics.counter("db_pool_opened_total", "Открытые синхронным пулом соединения")
+metrics.counter("db_pool_discarded_total", "Закрытые синхронным пулом соединения")
+metrics.counter("db_pool_timeouts_total", "Отказы синхронного пула по таймауту")
+metrics.gauge("db_pool_in_use", "Занятые соединения пула")
+metrics.ratio("db_pool_utilization", "Доля занятых соединений пула", "db_pool_in_use", ["db_pool_max_size"])
+metrics.gauge("db_executor_queue_depth", "Задачи, ожидающие потока БД")
+metrics.gauge("db_executor_running", "Задачи, выполняемые в потоках БД")
+metrics.counter("db_executor_wait_seconds_total", "Суммарное ожидание потока БД")
+metrics.counter("cache_hits_total", "Попадания в кеш")
+metrics.counter("cache_misses_total", "Промахи кеша")
+metrics.counter("cache_evictions_total", "Вытеснения из кеша")
+metrics.gauge("cache_size", "Записей в кеше")
+metrics.ratio("cache_hit_ratio", "Доля попаданий в кеш", "cache_hits_total", ["cache_hits_total", "cache_misses_total"])
+metrics.gauge("change_listener_connected", "Подписка на изменения активна")
+metrics.counter("log_records_dropped_total", "Записи лога, отброшенные при переполненной очереди")
+
+
+def collect_runtime_stats(registry: MetricsRegistry) -> None:
+    """Переносит в метрики статистику пулов, кешей и фоновых задач процесса."""
+    for pool, stats in pool_stats().items():
+        registry.set("db_pool_connections", stats["idle"], pool=pool, state="idle")
+        registry.set("db_pool_connections", stats["in_use"], pool=pool, state="in_use")
+        registry.set("db_pool_in_use", stats["in_use"], pool=pool)
+        registry.set("db_pool_max_size", stats["max_size"], pool=pool)
+        if pool == "sync":
+            registry.set("db_pool_waiting", stats["waiting"], pool=pool)
+            registry.set_total("db_pool_opened_total", stats["opened"], pool=pool)
+            registry.set_total("db_pool_discarded_total", stats["discarded"], pool=pool)
+            registry.set_total("db_pool_timeouts_total", stats["timeouts"], pool=pool)
+
+    executor = db_executor.stats()
+    registry.set("db_executor_queue_depth", executor["queue_depth"])
+    registry.set("db_executor_running", executor["running"])
+    registry.set_total("db_executor_wait_seconds_total", executor["wait_time_total"])
+
+    for name, cache in caches.items():
+        stats = cache.stats()
+        registry.set_total("cache_hits_total", stats["hits"], cache=name)
+        registry.set_total("cache_misses_total", stats["misses"], cache=name)
+        registry.set_total("cache_evictions_total", stats["evictions"], cache=name)
+        registry.set("cache_size", stats["size"], cache=name)
+
+    registry.set("change_listener_connected", int(change_listener.connected))
+    registry.set_total("log_records_dropped_total", dropped_log_records())
+
+
+metrics.add_collector(collect_runtime_stats)
+
+
+@router.get("/metrics", include_in_schema=False)
+def read_metrics():
+    # Синхронный обработчик: чтение снимков воркеров с диска идёт в пуле потоков
+    return Response(content=metrics.collect(), media_type="text/plain; version=0.0.4; charset=utf-8")
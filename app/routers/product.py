@@ -1,14 +1,56 @@
+import asyncio
 import logging
+from tempfile import SpooledTemporaryFile
+from typing import AsyncIterator, Optional
 
-from fastapi import APIRouter, status, Header, Depends
-from fastapi.responses import JSONResponse
+import orjson
+
+from fastapi import APIRouter, status, Header, Depends, Query, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from psycopg2 import errors
 
-from ..utils import verify_jwt, verify_admin
-from ..models.product import Product, ProductCreate
+from ..responses import FastJSONResponse
+from ..static import (
+    ICON_CACHE_MAX_AGE,
+    PRODUCTS_PAGE_SIZE,
+    PRODUCTS_PAGE_MAX_SIZE,
+    PRODUCTS_SEARCH_PAGE_SIZE,
+    PRODUCTS_SEARCH_PAGE_MAX_SIZE,
+    PRODUCTS_SEARCH_MAX_OFFSET,
+    PRODUCTS_EXPORT_BATCH_SIZE,
+    PRODUCTS_EXPORT_MAX_CONCURRENCY,
+    PRODUCTS_IMPORT_SPOOL_SIZE,
+    PRODUCTS_IMPORT_MAX_ERRORS
+)
+from ..utils import (
+    verify_jwt,
+    verify_admin,
+    detect_image_type,
+    parse_etags,
+    etag_matches,
+    encode_cursor,
+    decode_cursor
+)
+from ..models.product import (
+    Product,
+    ProductCreate,
+    ProductSort,
+    ProductExportFormat,
+    ProductImportFormat,
+    ProductImportResult
+)
+from ..database.executor import run_sync
 from ..database.product import (
+    PRODUCT_COLUMNS,
+    catalog_versions,
+    catalog_etag,
     get_all_products,
+    search_products,
+    normalize_search_text,
+    iter_products,
+    import_products,
     get_product,
+    get_product_icon,
     create_product,
     update_product,
     delete_product
@@ -19,12 +61,77 @@ router = APIRouter(
     tags=["Управление товарами"]
 )
 
+# Типы элементов ключа курсора для каждой сортировки: (id,) или (name, id)
+_CURSOR_KEY_TYPES = {
+    ProductSort.ID: (int,),
+    ProductSort.NAME: (str, int)
+}
+_NEXT_CURSOR_HEADER = {
+    "X-Next-Cursor": {
+        "description": "Токен следующей страницы для параметра cursor; отсутствует на последней странице",
+        "schema": {"type": "string"}
+    }
+}
 
-@router.get("", response_model=list[Product])
+
+def _cursor_key(position: dict, sort: ProductSort) -> tuple:
+    """Ключ последней строки из курсора; ValueError, если он не подходит для сортировки."""
+    key = position["key"]
+    types = _CURSOR_KEY_TYPES[sort]
+    # type() вместо isinstance: bool не должен проходить как int
+    if not isinstance(key, list) or len(key) != len(types) or \
+            any(type(value) is not expected for value, expected in zip(key, types)):
+        raise ValueError("Некорректный курсор")
+    return tuple(key)
+
+
+@router.get(
+    "",
+    response_model=list[Product],
+    responses={status.HTTP_200_OK: {"headers": _NEXT_CURSOR_HEADER}},
+    description=f"Каталог постранично: без limit возвращается первая страница из {PRODUCTS_PAGE_SIZE} товаров, "
+                "следующая запрашивается с cursor из заголовка X-Next-Cursor."
+)
 @verify_jwt
-async def read_products(authorization: str = Header(..., description="JWT токен в формате Bearer <token>")):
+async def read_products(
+        authorization: str = Header(..., description="JWT токен в формате Bearer <token>"),
+        limit: int = Query(PRODUCTS_PAGE_SIZE, ge=1, le=PRODUCTS_PAGE_MAX_SIZE,
+                           description=f"Размер страницы (по умолчанию {PRODUCTS_PAGE_SIZE})"),
+        cursor: Optional[str] = Query(None, description="Токен следующей страницы из заголовка X-Next-Cursor"),
+        sort: ProductSort = Query(ProductSort.ID, description="Поле сортировки"),
+        min_cost: Optional[int] = Query(None, ge=0, description="Минимальная стоимость"),
+        max_cost: Optional[int] = Query(None, ge=0, description="Максимальная стоимость"),
+        fields: Optional[str] = Query(None, description="Поля ответа через запятую, например id,name,cost"),
+        if_none_match: Optional[str] = Header(None)
+):
+    selected = None
+    after = None
     try:
-        return get_all_products()
+        if fields:
+            selected = [field.strip() for field in fields.split(",") if field.strip()]
+            unknown = set(selected) - set(PRODUCT_COLUMNS)
+            if unknown:
+                raise ValueError(f"Неизвестные поля: {', '.join(sorted(unknown))}")
+        if cursor:
+            position = decode_cursor(cursor)
+            if position.get("sort") != sort.value:
+                raise ValueError("Курсор получен для другой сортировки")
+            after = _cursor_key(position, sort)
+    except (ValueError, KeyError, TypeError) as e:
+        return JSONResponse(
+            content={"message": str(e) or "Некорректный курсор"},
+            status_code=status.HTTP_400_BAD_REQUEST
+        )
+
+    try:
+        # Версию берём до чтения: изменение во время запроса даст новый ETag при следующем
+        etag = await catalog_etag()
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if catalog_versions.enabled and etag_matches(if_none_match, etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        # Запрашиваем на одну строку больше, чтобы узнать, есть ли следующая страница
+        rows = await get_all_products(limit + 1, sort, after, min_cost, max_cost, selected)
     except Exception as e:
         logging.error(e)
         return JSONResponse(
@@ -32,18 +139,166 @@ async def read_products(authorization: str = Header(..., description="JWT ток
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        key = [last["name"], last["id"]] if sort == ProductSort.NAME else [last["id"]]
+        headers["X-Next-Cursor"] = encode_cursor({"sort": sort.value, "key": key})
+
+    if selected:
+        rows = [{field: row[field] for field in selected} for row in rows]
+    # Строки уже соответствуют Product (см. PRODUCT_COLUMNS) и кодируются без повторной проверки
+    return FastJSONResponse(content=rows, headers=headers)
+
+
+@router.get(
+    "/search",
+    response_model=list[Product],
+    responses={status.HTTP_200_OK: {"headers": _NEXT_CURSOR_HEADER}}
+)
+@verify_jwt
+async def search_products_endpoint(
+        authorization: str = Header(..., description="JWT токен в формате Bearer <token>"),
+        q: str = Query(..., min_length=1, max_length=100,
+                       description="Слова из имени или описания; неполное слово ищется как начало слова"),
+        limit: int = Query(PRODUCTS_SEARCH_PAGE_SIZE, ge=1, le=PRODUCTS_SEARCH_PAGE_MAX_SIZE,
+                           description="Размер страницы"),
+        cursor: Optional[str] = Query(None, description="Токен следующей страницы из заголовка X-Next-Cursor"),
+        if_none_match: Optional[str] = Header(None)
+):
+    text = normalize_search_text(q)
+    offset = 0
+    try:
+        if cursor:
+            position = decode_cursor(cursor)
+            if position.get("q") != text:
+                raise ValueError("Курсор получен для другого запроса")
+            offset = int(position["offset"])
+            if not 0 <= offset <= PRODUCTS_SEARCH_MAX_OFFSET:
+                raise ValueError("Некорректный курсор")
+    except (ValueError, KeyError, TypeError) as e:
+        return JSONResponse(
+            content={"message": str(e) or "Некорректный курсор"},
+            status_code=status.HTTP_400_BAD_REQUEST
+        )
+
+    try:
+        # Результаты поиска меняются только вместе с каталогом
+        etag = await catalog_etag()
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if catalog_versions.enabled and etag_matches(if_none_match, etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        rows = await search_products(text, limit + 1, offset)
+    except Exception as e:
+        logging.error(e)
+        return JSONResponse(
+            content={"message": "Ошибка поиска товаров"},
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+    if len(rows) > limit:
+        rows = rows[:limit]
+        if offset + limit <= PRODUCTS_SEARCH_MAX_OFFSET:
+            headers["X-Next-Cursor"] = encode_cursor({"q": text, "offset": offset + limit})
+    return FastJSONResponse(content=rows, headers=headers)
+
+
+# Выгрузка держит соединение асинхронного пула всё время передачи, в том числе медленному клиенту
+_export_slots = asyncio.Semaphore(PRODUCTS_EXPORT_MAX_CONCURRENCY)
+
+
+async def _export_chunks(export_format: ProductExportFormat) -> AsyncIterator[bytes]:
+    async with _export_slots:
+        separator = b"["
+        async for rows in iter_products(PRODUCTS_EXPORT_BATCH_SIZE):
+            if export_format == ProductExportFormat.NDJSON:
+                yield b"".join(orjson.dumps(row) + b"\n" for row in rows)
+            else:
+                yield separator + b",".join(orjson.dumps(row) for row in rows)
+                separator = b","
+        if export_format == ProductExportFormat.JSON:
+            yield b"[]" if separator == b"[" else b"]"
+
+
+@router.get(
+    "/export",
+    response_class=StreamingResponse,
+    responses={status.HTTP_200_OK: {"content": {"application/x-ndjson": {}, "application/json": {}}}}
+)
+@verify_jwt
+async def export_products(
+        authorization: str = Header(..., description="JWT токен в формате Bearer <token>"),
+        export_format: ProductExportFormat = Query(ProductExportFormat.NDJSON, alias="format",
+                                                   description="ndjson — по товару в строке, json — один массив")
+):
+    # Пачки читаются серверным курсором по мере отправки, память не зависит от размера каталога
+    if _export_slots.locked():
+        return JSONResponse(
+            content={"message": "Слишком много одновременных выгрузок, повторите позже"},
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            headers={"Retry-After": "5"}
+        )
+    media_type = "application/x-ndjson" if export_format == ProductExportFormat.NDJSON else "application/json"
+    return StreamingResponse(_export_chunks(export_format), media_type=media_type)
+
+
+@router.post(
+    "/import",
+    response_model=ProductImportResult,
+    dependencies=[Depends(verify_admin)],
+    openapi_extra={"requestBody": {"required": True, "content": {
+        "text/csv": {"schema": {"type": "string"}},
+        "application/x-ndjson": {"schema": {"type": "string"}}
+    }}}
+)
+async def import_products_file(
+        request: Request,
+        authorization: str = Header(..., description="JWT токен в формате Bearer <token>"),
+        import_format: ProductImportFormat = Query(ProductImportFormat.CSV, alias="format",
+                                                   description="csv — с заголовком name,description,cost; "
+                                                               "ndjson — по объекту в строке")
+):
+    # Тело сначала принимается целиком во временный файл (сверх порога — на диске): соединение
+    # и транзакция не удерживаются, пока медленный клиент передаёт файл
+    with SpooledTemporaryFile(max_size=PRODUCTS_IMPORT_SPOOL_SIZE) as upload:
+        async for chunk in request.stream():
+            upload.write(chunk)
+        upload.seek(0)
+        try:
+            return await run_sync(import_products, upload, import_format, PRODUCTS_IMPORT_MAX_ERRORS)
+        except ValueError as e:
+            return JSONResponse(
+                content={"message": f"Файл не может быть прочитан: {e}"},
+                status_code=status.HTTP_400_BAD_REQUEST
+            )
+        except Exception as e:
+            logging.error(e)
+            return JSONResponse(
+                content={"message": "Ошибка импорта товаров"},
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
 
 @router.get("/{product_id}", response_model=Product)
 @verify_jwt
 async def read_product(product_id: int,
-                       authorization: str = Header(..., description="JWT токен в формате Bearer <token>")):
+                       response: Response,
+                       authorization: str = Header(..., description="JWT токен в формате Bearer <token>"),
+                       if_none_match: Optional[str] = Header(None)):
     try:
-        product = get_product(product_id)
+        etag = await catalog_etag()
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if catalog_versions.enabled and etag_matches(if_none_match, etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        product = await get_product(product_id)
         if not product:
             return JSONResponse(
                 content={"message": "Товар не найден"},
                 status_code=status.HTTP_404_NOT_FOUND
             )
+        response.headers.update(headers)
         return product
     except Exception as e:
         logging.error(e)
@@ -53,11 +308,56 @@ async def read_product(product_id: int,
         )
 
 
+@router.get(
+    "/{product_id}/icon",
+    response_class=Response,
+    responses={
+        status.HTTP_200_OK: {"content": {"image/*": {}}, "description": "Иконка товара"},
+        status.HTTP_304_NOT_MODIFIED: {"description": "Иконка не изменилась"}
+    }
+)
+async def read_product_icon(
+        product_id: int,
+        v: Optional[str] = Query(None, description="Версия иконки (хеш) из icon_url"),
+        if_none_match: Optional[str] = Header(None)
+):
+    # Иконки не требуют токена, чтобы клиенты и CDN могли кешировать их по URL
+    try:
+        etags = parse_etags(if_none_match)
+        icon = await get_product_icon(product_id, etags[0] if len(etags) == 1 else None)
+        if not icon:
+            return JSONResponse(
+                content={"message": "Иконка не найдена"},
+                status_code=status.HTTP_404_NOT_FOUND
+            )
+
+        icon_hash, data = icon
+        # Надолго кешируется только URL с актуальной версией: после смены иконки icon_url другой
+        cache_control = f"public, max-age={ICON_CACHE_MAX_AGE}, immutable" if v == icon_hash else "public, no-cache"
+        headers = {
+            "ETag": f'"{icon_hash}"',
+            "Cache-Control": cache_control,
+            # Иконки загружают пользователи: SVG не должен выполнять скрипты в домене API,
+            # а браузер — угадывать тип вместо переданного
+            "X-Content-Type-Options": "nosniff",
+            "Content-Security-Policy": "sandbox"
+        }
+        if data is None or etag_matches(if_none_match, icon_hash):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return Response(content=data, media_type=detect_image_type(data), headers=headers)
+    except Exception as e:
+        logging.error(e)
+        return JSONResponse(
+            content={"message": "Ошибка получения иконки"},
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
 @router.post("", response_model=Product, dependencies=[Depends(verify_admin)])
 async def create_new_product(product: ProductCreate,
                              authorization: str = Header(..., description="JWT токен в формате Bearer <token>")):
     try:
-        return create_product(product)
+        return await create_product(product)
     except errors.UniqueViolation:
         return JSONResponse(
             content={"message": "Товар с таким именем уже существует"},
@@ -75,7 +375,7 @@ async def create_new_product(product: ProductCreate,
 async def update_existing_product(product_id: int, product: ProductCreate,
                                   authorization: str = Header(..., description="JWT токен в формате Bearer <token>")):
     try:
-        updated_product = update_product(product_id, product)
+        updated_product = await update_product(product_id, product)
         if not updated_product:
             return JSONResponse(
                 content={"message": "Товар не найден"},
@@ -99,7 +399,7 @@ async def update_existing_product(product_id: int, product: ProductCreate,
 async def delete_existing_product(product_id: int,
                                   authorization: str = Header(..., description="JWT токен в формате Bearer <token>")):
     try:
-        success = delete_product(product_id)
+        success = await delete_product(product_id)
         if not success:
             return JSONResponse(
                 content={"message": "Товар не найден"},
@@ -20,5 +20,5 @@ def get_profile(authorization: str = Header(...)):
     try:
         return get_user_profile(authorization)
     except Exception as e:
-        logger.error(f"Ошибка получения профиля: {str(e)}")
+        logger.error("Ошибка получения профиля: %s", e)
         raise HTTPException(status_code=500, detail="Ошибка сервера")
\ No newline at end of file
@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 from dotenv import load_dotenv
 
@@ -7,3 +8,95 @@ load_dotenv('.env')
 SECRET_KEY: str = os.getenv('SECRET_KEY', '')
 ALGORITHM: str = os.getenv('ALGORITHM', '')
 DATA_SOURCE: str = os.getenv('DATA_SOURCE', '')
+
+# Логирование: размер очереди записей (при переполнении записи отбрасываются) и доля
+# сохраняемых INFO-записей на горячих путях (корзина, чтение каталога)
+LOG_QUEUE_SIZE: int = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+LOG_HOT_PATH_SAMPLE_RATE: float = float(os.getenv('LOG_HOT_PATH_SAMPLE_RATE', '1'))
+
+# Журнал доступа: одна JSON-строка на запрос
+ACCESS_LOG_PATH: str = os.getenv('ACCESS_LOG_PATH', 'logs/access.log')
+
+# Метрики: каталог, в котором воркеры сохраняют снимки для /metrics, и период сохранения (сек.)
+METRICS_DIR: str = os.getenv('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'server-metrics'))
+METRICS_FLUSH_INTERVAL: float = float(os.getenv('METRICS_FLUSH_INTERVAL', '5'))
+
+# Пул соединений с БД (в пределах одного процесса-воркера)
+DB_POOL_MIN_SIZE: int = int(os.getenv('DB_POOL_MIN_SIZE', '1'))
+DB_POOL_MAX_SIZE: int = int(os.getenv('DB_POOL_MAX_SIZE', '10'))
+DB_POOL_TIMEOUT: float = float(os.getenv('DB_POOL_TIMEOUT', '5'))
+DB_POOL_MAX_IDLE: float = float(os.getenv('DB_POOL_MAX_IDLE', '300'))
+DB_POOL_MAX_LIFETIME: float = float(os.getenv('DB_POOL_MAX_LIFETIME', '3600'))
+DB_POOL_CHECK_INTERVAL: float = float(os.getenv('DB_POOL_CHECK_INTERVAL', '30'))
+
+# Журнал медленных запросов: порог (сек., 0 отключает) и доля медленных чтений, для которых
+# дополнительно снимается EXPLAIN (ANALYZE, BUFFERS). План выполняет запрос ещё раз и может
+# содержать значения параметров
+DB_SLOW_QUERY_THRESHOLD: float = float(os.getenv('DB_SLOW_QUERY_THRESHOLD', '0.2'))
+DB_SLOW_QUERY_EXPLAIN_RATE: float = float(os.getenv('DB_SLOW_QUERY_EXPLAIN_RATE', '0'))
+
+# Применять миграции схемы при старте; без них приложение не запустится на устаревшей схеме.
+# Индексы создаются без CONCURRENTLY: на больших таблицах лучше отключить ('0') и заранее
+# выполнить python -m app.database.migrations
+DB_MIGRATE_ON_STARTUP: bool = os.getenv('DB_MIGRATE_ON_STARTUP', '1') not in ('0', 'false', 'no')
+
+# Горячие запросы готовятся (PREPARE) один раз на соединение и выполняются по имени.
+# Отключается ('0') для пулеров вроде PgBouncer в режиме transaction, где сессия не сохраняется
+DB_PREPARED_STATEMENTS: bool = os.getenv('DB_PREPARED_STATEMENTS', '1') not in ('0', 'false', 'no')
+
+# Асинхронный пул (aiopg), которым пользуются async-роутеры
+DB_ASYNC_POOL_MIN_SIZE: int = int(os.getenv('DB_ASYNC_POOL_MIN_SIZE', '1'))
+DB_ASYNC_POOL_MAX_SIZE: int = int(os.getenv('DB_ASYNC_POOL_MAX_SIZE', '20'))
+
+# Время (сек.), на которое клиент может кешировать иконку по URL с версией (?v=<хеш>) без проверки ETag.
+# Новая иконка получает новый URL, поэтому срок может быть большим
+ICON_CACHE_MAX_AGE: int = int(os.getenv('ICON_CACHE_MAX_AGE', '31536000'))
+
+# Размер страницы каталога GET /products по умолчанию и максимально допустимый
+PRODUCTS_PAGE_SIZE: int = int(os.getenv('PRODUCTS_PAGE_SIZE', '100'))
+PRODUCTS_PAGE_MAX_SIZE: int = int(os.getenv('PRODUCTS_PAGE_MAX_SIZE', '1000'))
+
+# Поиск GET /products/search: размер страницы по умолчанию и максимальный, наибольшее смещение
+PRODUCTS_SEARCH_PAGE_SIZE: int = int(os.getenv('PRODUCTS_SEARCH_PAGE_SIZE', '20'))
+PRODUCTS_SEARCH_PAGE_MAX_SIZE: int = int(os.getenv('PRODUCTS_SEARCH_PAGE_MAX_SIZE', '100'))
+PRODUCTS_SEARCH_MAX_OFFSET: int = int(os.getenv('PRODUCTS_SEARCH_MAX_OFFSET', '1000'))
+
+# Количество строк, которое серверный курсор выгрузки каталога читает за один раз
+PRODUCTS_EXPORT_BATCH_SIZE: int = int(os.getenv('PRODUCTS_EXPORT_BATCH_SIZE', '500'))
+# Одновременных выгрузок на процесс: каждая держит соединение асинхронного пула до конца передачи
+PRODUCTS_EXPORT_MAX_CONCURRENCY: int = int(os.getenv('PRODUCTS_EXPORT_MAX_CONCURRENCY', '2'))
+
+# Импорт каталога: сколько байт тела запроса держать в памяти до сброса во временный файл
+# и сколько ошибок в строках возвращать в отчёте (остальные только считаются)
+PRODUCTS_IMPORT_SPOOL_SIZE: int = int(os.getenv('PRODUCTS_IMPORT_SPOOL_SIZE', str(1024 * 1024)))
+PRODUCTS_IMPORT_MAX_ERRORS: int = int(os.getenv('PRODUCTS_IMPORT_MAX_ERRORS', '100'))
+
+# Кеш товаров и страниц каталога в памяти воркера; время жизни 0 отключает кеш.
+# Изменения из других воркеров приходят через LISTEN/NOTIFY, TTL — страховка на случай разрыва
+PRODUCT_CACHE_TTL: float = float(os.getenv('PRODUCT_CACHE_TTL', '300'))
+PRODUCT_CACHE_MAX_SIZE: int = int(os.getenv('PRODUCT_CACHE_MAX_SIZE', '1000'))
+CATALOG_CACHE_MAX_SIZE: int = int(os.getenv('CATALOG_CACHE_MAX_SIZE', '256'))
+SEARCH_CACHE_MAX_SIZE: int = int(os.getenv('SEARCH_CACHE_MAX_SIZE', '512'))
+
+# Подписка воркера на уведомления об изменениях каталога
+PRODUCT_CHANGES_HEALTH_CHECK_INTERVAL: float = float(os.getenv('PRODUCT_CHANGES_HEALTH_CHECK_INTERVAL', '30'))
+PRODUCT_CHANGES_RECONNECT_MAX_DELAY: float = float(os.getenv('PRODUCT_CHANGES_RECONNECT_MAX_DELAY', '30'))
+
+# Кеш проверенных JWT (время жизни записи ограничено также полем exp токена)
+JWT_CACHE_TTL: float = float(os.getenv('JWT_CACHE_TTL', '300'))
+JWT_CACHE_MAX_SIZE: int = int(os.getenv('JWT_CACHE_MAX_SIZE', '10000'))
+
+# Кеш id пользователей по логину для токенов без user_id
+USER_ID_CACHE_TTL: float = float(os.getenv('USER_ID_CACHE_TTL', '3600'))
+USER_ID_CACHE_MAX_SIZE: int = int(os.getenv('USER_ID_CACHE_MAX_SIZE', '10000'))
+
+# Хеширование паролей: первая схема — для новых хешей, остальные переводятся на неё при входе
+PASSWORD_SCHEMES: list = [scheme.strip() for scheme in os.getenv('PASSWORD_SCHEMES', 'bcrypt,hex_sha256').split(',')]
+PASSWORD_BCRYPT_ROUNDS: int = int(os.getenv('PASSWORD_BCRYPT_ROUNDS', '12'))
+PASSWORD_HASH_WORKERS: int = int(os.getenv('PASSWORD_HASH_WORKERS', '2'))
+
+# Максимальное число позиций в одном запросе POST /cart/batch
+CART_BATCH_MAX_ITEMS: int = int(os.getenv('CART_BATCH_MAX_ITEMS', '500'))
+
+# Сколько версий корзин (для ETag) хранит воркер
+CART_VERSIONS_MAX_SIZE: int = int(os.getenv('CART_VERSIONS_MAX_SIZE', '100000'))
@@ -0,0 +1,143 @@
+"""Замер времени запросов: id запроса, время в БД, заголовок Server-Timing и журнал доступа."""
+import json
+import re
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging import Logger
+from typing import Any, Dict, List, Optional
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .logger import configure_logs, request_id
+from .metrics import metrics
+from .static import ACCESS_LOG_PATH
+
+__all__: List[str] = [
+    "RequestTiming",
+    "TimingMiddleware",
+    "current_timing",
+    "record_db_time"
+]
+
+# Одна JSON-строка на запрос, без префикса формата и без дублирования в консоль
+access_logger: Logger = configure_logs("access", logs_path=ACCESS_LOG_PATH, log_format="%(message)s", console=False)
+
+REQUEST_ID_HEADER = "X-Request-ID"
+# Входящий id принимается, только если он не сломает заголовки и журнал
+_REQUEST_ID_PATTERN = re.compile(r"[A-Za-z0-9._:-]{1,128}")
+
+
+class RequestTiming:
+    """Счётчики времени одного запроса. Объект общий для запроса и потоков, в которые он уходит."""
+
+    __slots__ = ("started", "db_time", "db_calls")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_time = 0.0
+        self.db_calls = 0
+
+    def server_timing(self) -> str:
+        total = (time.perf_counter() - self.started) * 1000
+        db = self.db_time * 1000
+        return f'db;dur={db:.1f};desc="{self.db_calls} conn", app;dur={max(total - db, 0.0):.1f}, total;dur={total:.1f}'
+
+
+_timing: ContextVar[Optional[RequestTiming]] = ContextVar("request_timing", default=None)
+
+
+def current_timing() -> Optional[RequestTiming]:
+    return _timing.get()
+
+
+def record_db_time(seconds: float) -> None:
+    """Добавляет время работы с соединением БД к текущему запросу (вне запроса ничего не делает)."""
+    timing = _timing.get()
+    if timing is not None:
+        timing.db_time += seconds
+        timing.db_calls += 1
+
+
+class _JsonMessage:
+    """Сериализуется в JSON только при записи, в потоке логирования."""
+
+    __slots__ = ("data",)
+
+    def __init__(self, data: Dict[str, Any]):
+        self.data = data
+
+    def __str__(self) -> str:
+        return json.dumps(self.data, ensure_ascii=False)
+
+
+class TimingMiddleware:
+    """
+    ASGI-middleware: назначает запросу id (или берёт из X-Request-ID), считает общее время
+    и время в БД, отдаёт их в Server-Timing и пишет строку в журнал доступа.
+    Server-Timing отражает время до начала ответа; журнал — до конца передачи тела.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                incoming = value.decode("latin-1")
+                break
+        rid = incoming if incoming and _REQUEST_ID_PATTERN.fullmatch(incoming) else uuid.uuid4().hex
+
+        timing = RequestTiming()
+        rid_token = request_id.set(rid)
+        timing_token = _timing.set(timing)
+        status_code = 500
+        sent = 0
+        metrics.add("http_requests_in_flight", 1)
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal status_code, sent
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append(REQUEST_ID_HEADER, rid)
+                headers.append("Server-Timing", timing.server_timing())
+            elif message["type"] == "http.response.body":
+                sent += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        except Exception as e:
+            metrics.inc("http_exceptions_total", exception=type(e).__name__)
+            raise
+        finally:
+            duration = time.perf_counter() - timing.started
+            # Шаблон пути, а не сам путь: иначе метка получит по значению на каждый id
+            route = getattr(scope.get("route"), "path", "unmatched")
+            metrics.add("http_requests_in_flight", -1)
+            metrics.inc("http_requests_total", method=scope["method"], route=route, status=status_code)
+            metrics.observe("http_request_duration_seconds", duration, method=scope["method"], route=route)
+            client = scope.get("client")
+            access_logger.info(_JsonMessage({
+                "time": datetime.now(timezone.utc).isoformat(),
+                "request_id": rid,
+                "method": scope["method"],
+                "path": scope["path"],
+                "query": scope["query_string"].decode("latin-1"),
+                "status": status_code,
+                "duration_ms": round(duration * 1000, 3),
+                "db_ms": round(timing.db_time * 1000, 3),
+                "db_calls": timing.db_calls,
+                "bytes": sent,
+                "client": client[0] if client else None
+            }))
+            _timing.reset(timing_token)
+            request_id.reset(rid_token)
@@ -1,18 +1,28 @@
+import base64
+import json
+import time
+from contextvars import ContextVar
 from datetime import datetime, timezone, timedelta
 from collections.abc import Callable
 from functools import wraps
-from typing import Optional
+from typing import Optional, List
 
 import jwt
 from jwt import InvalidTokenError, ExpiredSignatureError, PyJWTError as JWTError
 from fastapi import HTTPException, Depends, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
+from .cache import TTLCache
 from .models.authorization import UserRole
-from .static import SECRET_KEY, ALGORITHM
+from .static import SECRET_KEY, ALGORITHM, JWT_CACHE_TTL, JWT_CACHE_MAX_SIZE
 
 security = HTTPBearer()
 
+# Уже проверенные токены: запись живёт не дольше срока действия самого токена
+jwt_cache = TTLCache("jwt", JWT_CACHE_MAX_SIZE, JWT_CACHE_TTL)
+# Заголовок Authorization и payload, проверенные verify_jwt для текущего запроса
+_request_jwt: ContextVar[Optional[tuple]] = ContextVar("request_jwt", default=None)
+
 
 def check_jwt(token: str) -> Optional[dict]:
     if not token:
@@ -27,7 +37,17 @@ def check_jwt(token: str) -> Optional[dict]:
             detail="Неверный формат заголовка авторизации",
         )
 
-    return jwt.decode(jwt=token, key=SECRET_KEY, algorithms=ALGORITHM)
+    payload = jwt_cache.get(token)
+    if payload is not None:
+        return payload
+
+    payload = jwt.decode(jwt=token, key=SECRET_KEY, algorithms=ALGORITHM)
+    ttl = JWT_CACHE_TTL
+    if isinstance(payload.get("exp"), (int, float)):
+        ttl = min(ttl, payload["exp"] - time.time())
+    if ttl > 0:
+        jwt_cache.set(token, payload, ttl=ttl)
+    return payload
 
 
 def verify_jwt(f: Callable):
@@ -42,27 +62,37 @@ def verify_jwt(f: Callable):
         """
         try:
             authorization = kwargs.get("authorization")
-            check_jwt(authorization)
+            payload = check_jwt(authorization)
         except ExpiredSignatureError:
             raise HTTPException(status.HTTP_401_UNAUTHORIZED, "Срок действия токена истек")
         except InvalidTokenError:
             raise HTTPException(status.HTTP_401_UNAUTHORIZED, "Недействительный токен")
-        return await f(*args, **kwargs)
+
+        # Обработчик получает payload через get_jwt_payload без повторной проверки
+        reset_token = _request_jwt.set((authorization, payload))
+        try:
+            return await f(*args, **kwargs)
+        finally:
+            _request_jwt.reset(reset_token)
 
     return wrapper
 
 
-def create_jwt(login: str, role: UserRole, lifetime=timedelta(days=1)) -> str:
-    return jwt.encode({
+def create_jwt(login: str, role: UserRole, user_id: Optional[int] = None, lifetime=timedelta(days=1)) -> str:
+    payload = {
         "username": login,
         "role": role.value,
         "exp": datetime.now(tz=timezone.utc) + lifetime,
-    }, SECRET_KEY, algorithm=ALGORITHM)
+    }
+    if user_id is not None:
+        payload["user_id"] = user_id
+    return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
 
 
 def     verify_admin(authorization: HTTPAuthorizationCredentials = Depends(security)) -> dict:
     try:
-        payload = check_jwt(authorization.credentials)
+        # check_jwt ожидает заголовок целиком: "Bearer <token>"
+        payload = check_jwt(f"{authorization.scheme} {authorization.credentials}")
         if payload.get("role") != UserRole.ADMIN.value:
             raise HTTPException(status_code=403, detail="Forbidden")
         return payload
@@ -72,10 +102,79 @@ def     verify_admin(authorization: HTTPAuthorizationCredentials = Depends(secur
         raise HTTPException(status_code=401, detail="Invalid token")
 
 
+def get_jwt_payload(authorization: str) -> Optional[dict]:
+    """Payload токена: уже проверенный verify_jwt в этом запросе либо из кеша/после проверки."""
+    verified = _request_jwt.get()
+    if verified is not None and verified[0] == authorization:
+        return verified[1]
+    return check_jwt(authorization)
+
+
 def get_jwt_login(authorization: str) -> str:
-    decoded_info: dict | None = check_jwt(authorization)
+    decoded_info: dict | None = get_jwt_payload(authorization)
 
     if decoded_info is None or len(decoded_info) == 0:
         raise HTTPException(status.HTTP_401_UNAUTHORIZED, "Неверный payload токена")
 
     return decoded_info["username"]
+
+
+IMAGE_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+    (b"\x00\x00\x01\x00", "image/x-icon"),
+)
+
+
+def detect_image_type(data: bytes) -> str:
+    """Определяет MIME-тип изображения по сигнатуре файла."""
+    for signature, media_type in IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return media_type
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    head = data[:256].lstrip().lower()
+    if head.startswith(b"<svg") or (head.startswith(b"<?xml") and b"<svg" in head):
+        return "image/svg+xml"
+    return "application/octet-stream"
+
+
+def parse_etags(if_none_match: Optional[str]) -> List[str]:
+    """Разбирает заголовок If-None-Match в список значений ETag без кавычек и префикса W/."""
+    if not if_none_match:
+        return []
+    etags = []
+    for item in if_none_match.split(","):
+        item = item.strip()
+        if item.startswith("W/"):
+            item = item[2:]
+        if item:
+            etags.append(item.strip('"'))
+    return etags
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Слабое сравнение ETag из If-None-Match с текущим значением (RFC 9110)."""
+    etags = parse_etags(if_none_match)
+    return "*" in etags or parse_etags(etag)[0] in etags
+
+
+def encode_cursor(payload: dict) -> str:
+    """Упаковывает ключ последней строки страницы в непрозрачный токен курсора."""
+    raw = json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str) -> dict:
+    """Распаковывает токен курсора. При повреждённом токене выбрасывает ValueError."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        payload = json.loads(raw)
+    except Exception as e:
+        raise ValueError("Некорректный курсор") from e
+    if not isinstance(payload, dict):
+        raise ValueError("Некорректный курсор")
+    return payload
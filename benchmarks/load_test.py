@@ -0,0 +1,478 @@
+"""
+Нагрузочный тест API: запускает приложение (uvicorn) против локального PostgreSQL,
+готовит данные через API и гоняет смесь сценариев: вход, просмотр каталога,
+корзина, изменения товаров администратором. Для каждой операции считает
+пропускную способность и задержки p50/p95/p99 и сохраняет результат в JSON,
+который можно сравнить с результатом другого коммита.
+
+БД должна быть отдельной (тест добавляет пользователей и товары) и уже содержать схему.
+Если у проверяемой версии нет импорта товаров и постраничного каталога, товары
+создаются по одному, а список id берётся одним запросом GET /products.
+Нужны переменные окружения DATA_SOURCE (и, если не заданы, будут подставлены
+тестовые SECRET_KEY и ALGORITHM).
+
+    pip install -r benchmarks/requirements.txt
+    python -m benchmarks.load_test --duration 60 --concurrency 32 --output benchmarks/results/head.json
+    python -m benchmarks.load_test --duration 60 --concurrency 32 --baseline benchmarks/results/head.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import uuid
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Вес операций в смеси: вероятность выбора операции пропорциональна весу
+MIXES: Dict[str, Dict[str, int]] = {
+    "default": {
+        "login": 3,
+        "catalog_page": 30,
+        "product": 15,
+        "cart_get": 15,
+        "cart_add": 12,
+        "cart_update": 8,
+        "cart_batch": 4,
+        "cart_clear": 3,
+        "admin_create": 3,
+        "admin_update": 4,
+        "admin_delete": 3
+    },
+    "browse": {
+        "catalog_page": 60,
+        "product": 30,
+        "cart_get": 10
+    },
+    "cart": {
+        "cart_get": 30,
+        "cart_add": 30,
+        "cart_update": 20,
+        "cart_batch": 10,
+        "cart_clear": 10
+    },
+    "admin": {
+        "admin_create": 30,
+        "admin_update": 50,
+        "admin_delete": 20
+    }
+}
+
+# Ответы, которые считаются успешными
+OK_STATUSES = {200, 201, 204, 304}
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Процентиль по ближайшему рангу; values отсортирован."""
+    if not values:
+        return 0.0
+    rank = max(int(round(q / 100 * len(values) + 0.5)) - 1, 0)
+    return values[min(rank, len(values) - 1)]
+
+
+class Recorder:
+    """Задержки и коды ответов по операциям."""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.enabled = True
+
+    def add(self, operation: str, latency: float, status: int) -> None:
+        if not self.enabled:
+            return
+        self.latencies[operation].append(latency)
+        self.statuses[operation][status] += 1
+        if status not in OK_STATUSES:
+            self.errors[operation] += 1
+
+    def report(self, duration: float) -> Dict[str, dict]:
+        results = {}
+        for operation in sorted(self.latencies):
+            values = sorted(self.latencies[operation])
+            results[operation] = {
+                "count": len(values),
+                "errors": self.errors[operation],
+                "throughput": len(values) / duration,
+                "mean_ms": sum(values) / len(values) * 1000,
+                "p50_ms": percentile(values, 50) * 1000,
+                "p95_ms": percentile(values, 95) * 1000,
+                "p99_ms": percentile(values, 99) * 1000,
+                "max_ms": values[-1] * 1000,
+                "statuses": {str(code): count for code, count in sorted(self.statuses[operation].items())}
+            }
+        all_values = sorted(value for values in self.latencies.values() for value in values)
+        results["total"] = {
+            "count": len(all_values),
+            "errors": sum(self.errors.values()),
+            "throughput": len(all_values) / duration,
+            "mean_ms": sum(all_values) / len(all_values) * 1000 if all_values else 0.0,
+            "p50_ms": percentile(all_values, 50) * 1000,
+            "p95_ms": percentile(all_values, 95) * 1000,
+            "p99_ms": percentile(all_values, 99) * 1000,
+            "max_ms": all_values[-1] * 1000 if all_values else 0.0
+        }
+        return results
+
+
+class Scenario:
+    """Общие данные прогона: токены, id товаров, состояние пользователей."""
+
+    def __init__(self, client: httpx.AsyncClient, recorder: Recorder, rng: random.Random,
+                 prefix: str, page_size: int, use_etags: bool):
+        self.client = client
+        self.recorder = recorder
+        self.rng = rng
+        self.prefix = prefix
+        self.page_size = page_size
+        self.use_etags = use_etags
+        self.password = "bench-password"
+        self.admin_token = ""
+        self.users: List[Tuple[str, str]] = []  # (логин, токен)
+        self.product_ids: List[int] = []
+        self.created_ids: List[int] = []
+
+    async def request(self, operation: str, method: str, url: str, token: Optional[str] = None,
+                      **kwargs) -> httpx.Response:
+        headers = kwargs.pop("headers", {})
+        if token:
+            headers["authorization"] = f"Bearer {token}"
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, headers=headers, **kwargs)
+        except httpx.HTTPError:
+            self.recorder.add(operation, time.perf_counter() - started, 0)
+            raise
+        self.recorder.add(operation, time.perf_counter() - started, response.status_code)
+        return response
+
+    async def register(self, username: str, role: str = "user") -> str:
+        response = await self.client.post("/auth/registration", json={
+            "username": username, "password": self.password, "role": role
+        })
+        response.raise_for_status()
+        return response.json()["token"]
+
+    async def setup(self, users: int, products: int) -> None:
+        self.admin_token = await self.register(f"{self.prefix}-admin", "admin")
+        names = [f"{self.prefix}-user-{index}" for index in range(users)]
+        tokens = await asyncio.gather(*(self.register(name) for name in names))
+        self.users = list(zip(names, tokens))
+
+        products_data = [(f"{self.prefix}-product-{index}", f"Товар {index}", self.rng.randint(1, 100000))
+                         for index in range(products)]
+        rows = "".join(f"{name},{description},{cost}\n" for name, description, cost in products_data)
+        response = await self.client.post(
+            "/products/import",
+            content="name,description,cost\n" + rows,
+            headers={"authorization": f"Bearer {self.admin_token}", "content-type": "text/csv"}
+        )
+        if response.status_code in (404, 405):
+            # Версия без импорта и постраничного каталога (например, исходная):
+            # товары по одному, каталог одним запросом
+            await self.create_products(products_data)
+            response = await self.client.get("/products",
+                                             headers={"authorization": f"Bearer {self.admin_token}"})
+            response.raise_for_status()
+            self.product_ids = [row["id"] for row in response.json()]
+            return
+        response.raise_for_status()
+
+        cursor = None
+        while True:
+            params = {"limit": 1000, "fields": "id"}
+            if cursor:
+                params["cursor"] = cursor
+            response = await self.client.get("/products", params=params,
+                                              headers={"authorization": f"Bearer {self.admin_token}"})
+            response.raise_for_status()
+            self.product_ids.extend(row["id"] for row in response.json())
+            cursor = response.headers.get("x-next-cursor")
+            if not cursor:
+                break
+
+    async def create_products(self, products_data: List[Tuple[str, str, int]]) -> None:
+        semaphore = asyncio.Semaphore(16)
+
+        async def create(name: str, description: str, cost: int) -> int:
+            async with semaphore:
+                response = await self.client.post(
+                    "/products",
+                    json={"name": name, "description": description, "cost": cost},
+                    headers={"authorization": f"Bearer {self.admin_token}"}
+                )
+                return response.status_code
+
+        head, rest = products_data[:1], products_data[1:]
+        statuses = [await create(*product) for product in head]
+        if statuses == [401]:
+            # В исходной версии verify_admin отклоняет любой токен: товары пишем прямо в БД
+            await asyncio.to_thread(insert_products, products_data)
+            return
+        statuses += await asyncio.gather(*(create(*product) for product in rest))
+        failed = [code for code in statuses if code not in OK_STATUSES]
+        if failed:
+            raise RuntimeError(f"Не удалось создать товары: {len(failed)} ответов с ошибкой, например {failed[0]}")
+
+
+def insert_products(products_data: List[Tuple[str, str, int]]) -> None:
+    """Запись товаров в БД из DATA_SOURCE в обход API."""
+    import psycopg2
+    from psycopg2.extras import execute_values
+
+    with psycopg2.connect(os.environ["DATA_SOURCE"]) as connection:
+        with connection.cursor() as cursor:
+            execute_values(cursor, "INSERT INTO products (name, description, cost) VALUES %s", products_data)
+    connection.close()
+
+class VirtualUser:
+    """Один клиент: выполняет случайные операции смеси до окончания теста."""
+
+    def __init__(self, scenario: Scenario, index: int, mix: Dict[str, int]):
+        self.scenario = scenario
+        self.username, self.token = scenario.users[index % len(scenario.users)]
+        self.operations = list(mix)
+        self.weights = list(mix.values())
+        self.cursor: Optional[str] = None
+        self.etags: Dict[Optional[str], str] = {}
+        self.cart: set = set()
+
+    async def run(self, deadline: float) -> None:
+        rng = self.scenario.rng
+        while time.perf_counter() < deadline:
+            operation = rng.choices(self.operations, self.weights)[0]
+            try:
+                await getattr(self, operation)()
+            except httpx.HTTPError:
+                pass
+
+    async def login(self) -> None:
+        response = await self.scenario.request("login", "POST", "/auth/login", json={
+            "username": self.username, "password": self.scenario.password
+        })
+        if response.status_code == 200:
+            self.token = response.json()["token"]
+
+    async def catalog_page(self) -> None:
+        params = {"limit": self.scenario.page_size}
+        if self.cursor:
+            params["cursor"] = self.cursor
+        headers = {}
+        if self.scenario.use_etags and self.cursor in self.etags:
+            headers["if-none-match"] = self.etags[self.cursor]
+        response = await self.scenario.request("catalog_page", "GET", "/products", self.token,
+                                               params=params, headers=headers)
+        if response.status_code == 200:
+            if "etag" in response.headers:
+                self.etags[self.cursor] = response.headers["etag"]
+            self.cursor = response.headers.get("x-next-cursor")
+        elif response.status_code != 304:
+            self.cursor = None
+
+    async def product(self) -> None:
+        product_id = self.scenario.rng.choice(self.scenario.product_ids)
+        await self.scenario.request("product", "GET", f"/products/{product_id}", self.token)
+
+    async def cart_get(self) -> None:
+        await self.scenario.request("cart_get", "GET", "/cart", self.token)
+
+    async def cart_add(self) -> None:
+        product_id = self.scenario.rng.choice(self.scenario.product_ids)
+        response = await self.scenario.request("cart_add", "POST", "/cart", self.token, json={
+            "product_id": product_id, "amount": self.scenario.rng.randint(1, 5)
+        })
+        if response.status_code == 200:
+            self.cart.add(product_id)
+
+    async def cart_update(self) -> None:
+        if not self.cart:
+            return await self.cart_add()
+        product_id = self.scenario.rng.choice(sorted(self.cart))
+        amount = self.scenario.rng.randint(0, 5)
+        await self.scenario.request("cart_update", "POST", "/cart/update_amount", self.token, json={
+            "product_id": product_id, "amount": amount
+        })
+        if amount == 0:
+            self.cart.discard(product_id)
+
+    async def cart_batch(self) -> None:
+        rng = self.scenario.rng
+        items = [{"product_id": product_id, "amount": rng.randint(0, 5)}
+                 for product_id in rng.sample(self.scenario.product_ids, min(10, len(self.scenario.product_ids)))]
+        response = await self.scenario.request("cart_batch", "POST", "/cart/batch", self.token, json=items)
+        if response.status_code == 200:
+            for item in items:
+                (self.cart.add if item["amount"] else self.cart.discard)(item["product_id"])
+
+    async def cart_clear(self) -> None:
+        await self.scenario.request("cart_clear", "DELETE", "/cart", self.token)
+        self.cart.clear()
+
+    async def admin_create(self) -> None:
+        scenario = self.scenario
+        response = await scenario.request("admin_create", "POST", "/products", scenario.admin_token, json={
+            "name": f"{scenario.prefix}-new-{uuid.uuid4().hex}",
+            "description": "Создан нагрузочным тестом",
+            "cost": scenario.rng.randint(1, 100000)
+        })
+        if response.status_code == 200:
+            scenario.created_ids.append(response.json()["id"])
+
+    async def admin_update(self) -> None:
+        scenario = self.scenario
+        if not scenario.created_ids:
+            return await self.admin_create()
+        product_id = scenario.rng.choice(scenario.created_ids)
+        await scenario.request("admin_update", "PUT", f"/products/{product_id}", scenario.admin_token, json={
+            "name": f"{scenario.prefix}-upd-{uuid.uuid4().hex}",
+            "description": "Изменён нагрузочным тестом",
+            "cost": scenario.rng.randint(1, 100000)
+        })
+
+    async def admin_delete(self) -> None:
+        scenario = self.scenario
+        if not scenario.created_ids:
+            return await self.admin_create()
+        product_id = scenario.created_ids.pop(scenario.rng.randrange(len(scenario.created_ids)))
+        await scenario.request("admin_delete", "DELETE", f"/products/{product_id}", scenario.admin_token)
+
+
+def start_server(port: int, workers: int) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.setdefault("SECRET_KEY", "benchmark-secret")
+    env.setdefault("ALGORITHM", "HS256")
+    if not env.get("DATA_SOURCE"):
+        sys.exit("Не задана переменная окружения DATA_SOURCE")
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port),
+         "--workers", str(workers), "--no-access-log", "--log-level", "warning"],
+        cwd=ROOT, env=env
+    )
+
+
+async def wait_ready(client: httpx.AsyncClient, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/openapi.json")).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("Приложение не запустилось")
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(results: Dict[str, dict], baseline: Optional[Dict[str, dict]] = None) -> None:
+    header = f"{'операция':<14}{'запросов':>9}{'ошибок':>8}{'rps':>9}{'p50 мс':>9}{'p95 мс':>9}{'p99 мс':>9}"
+    print(header)
+    print("-" * len(header))
+    for operation, row in results.items():
+        print(f"{operation:<14}{row['count']:>9}{row['errors']:>8}{row['throughput']:>9.1f}"
+              f"{row['p50_ms']:>9.2f}{row['p95_ms']:>9.2f}{row['p99_ms']:>9.2f}")
+        base = (baseline or {}).get(operation)
+        if base:
+            changes = []
+            for key in ("throughput", "p50_ms", "p95_ms", "p99_ms"):
+                if base[key]:
+                    changes.append(f"{key} {(row[key] - base[key]) / base[key] * 100:+.1f}%")
+            print(f"{'':<14}к базовому: {', '.join(changes)}")
+
+
+async def run(args: argparse.Namespace) -> dict:
+    rng = random.Random(args.seed)
+    server = None
+    base_url = args.base_url
+    if not base_url:
+        server = start_server(args.port, args.workers)
+        base_url = f"http://127.0.0.1:{args.port}"
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    try:
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.timeout) as client:
+            await wait_ready(client, 30)
+            recorder = Recorder()
+            scenario = Scenario(client, recorder, rng, f"bench-{uuid.uuid4().hex[:8]}",
+                                args.page_size, args.etags)
+            await scenario.setup(max(args.users, 1), args.products)
+
+            mix = MIXES[args.mix]
+            virtual_users = [VirtualUser(scenario, index, mix) for index in range(args.concurrency)]
+            if args.warmup > 0:
+                recorder.enabled = False
+                deadline = time.perf_counter() + args.warmup
+                await asyncio.gather(*(user.run(deadline) for user in virtual_users))
+                recorder.enabled = True
+
+            started = time.perf_counter()
+            deadline = started + args.duration
+            await asyncio.gather(*(user.run(deadline) for user in virtual_users))
+            duration = time.perf_counter() - started
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "base_url": base_url,
+            "duration": duration,
+            "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")}
+        },
+        "results": recorder.report(duration)
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Нагрузочный тест API")
+    parser.add_argument("--base-url", help="Адрес уже запущенного приложения; без него приложение запускается")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--workers", type=int, default=2, help="Процессы uvicorn, как в Dockerfile")
+    parser.add_argument("--mix", choices=sorted(MIXES), default="default")
+    parser.add_argument("--duration", type=float, default=30, help="Длительность замера, сек.")
+    parser.add_argument("--warmup", type=float, default=5, help="Прогрев без записи результатов, сек.")
+    parser.add_argument("--concurrency", type=int, default=16, help="Одновременных клиентов")
+    parser.add_argument("--users", type=int, default=16, help="Зарегистрировать пользователей")
+    parser.add_argument("--products", type=int, default=2000, help="Загрузить товаров")
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--etags", action="store_true", help="Отправлять If-None-Match, как браузер")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Куда сохранить результаты (JSON)")
+    parser.add_argument("--baseline", help="Результаты, с которыми сравнить (JSON)")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)["results"]
+    print_report(result["results"], baseline)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(result, file, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
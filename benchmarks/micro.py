@@ -0,0 +1,225 @@
+"""
+Микробенчмарки CPU-затрат одного запроса: построение моделей из строк RealDictCursor,
+повторная проверка списков через response_model, кодирование каталога в JSON
+(в том числе с иконками в base64) и создание/проверка JWT.
+Каждый замер повторяется для нескольких размеров каталога; результаты сохраняются в JSON
+и сравниваются с сохранёнными ранее: при замедлении сверх порога код возврата 1.
+
+    python -m benchmarks.micro --output benchmarks/results/micro-head.json
+    python -m benchmarks.micro --baseline benchmarks/results/micro-head.json --threshold 0.15
+"""
+import argparse
+import base64
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import orjson
+
+os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+os.environ.setdefault("ALGORITHM", "HS256")
+
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_model_field  # noqa: E402
+
+from app.models.authorization import UserRole  # noqa: E402
+from app.models.cart import Cart  # noqa: E402
+from app.models.product import Product  # noqa: E402
+from app.responses import FastJSONResponse  # noqa: E402
+from app.utils import check_jwt, create_jwt, jwt_cache  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ICON_SIZE = 4096
+
+
+def product_rows(count: int) -> List[dict]:
+    """Строки, как их возвращает get_all_products."""
+    return [{
+        "id": index,
+        "name": f"Товар {index}",
+        "description": f"Описание товара номер {index}, достаточно длинное для реального каталога",
+        "cost": 100 + index % 10000,
+        "icon_url": f"/products/{index}/icon" if index % 2 else None
+    } for index in range(1, count + 1)]
+
+
+def cart_rows(count: int) -> List[dict]:
+    """Строки, как их возвращает запрос get_user_cart."""
+    return [{
+        "id": index,
+        "product_id": index,
+        "amount": 1 + index % 5,
+        "user_id": 1,
+        "name": f"Товар {index}",
+        "cost": 100 + index % 10000,
+        "icon_url": f"/products/{index}/icon" if index % 2 else None
+    } for index in range(1, count + 1)]
+
+
+def rows_with_icons(rows: List[dict]) -> List[dict]:
+    """Каталог с иконками внутри ответа — как было до отдельного GET /products/{id}/icon."""
+    icon = base64.b64encode(os.urandom(ICON_SIZE)).decode("ascii")
+    return [{**row, "icon": icon} for row in rows]
+
+
+def run_coroutine(coroutine: Any) -> Any:
+    """Выполняет корутину, которая ничего не ждёт (serialize_response при is_coroutine=True)."""
+    try:
+        coroutine.send(None)
+    except StopIteration as stop:
+        return stop.value
+    raise RuntimeError("Корутина ожидает событие, для замера нужен цикл событий")
+
+
+def response_model_path(field: Any, content: Any) -> bytes:
+    """То, что FastAPI делает с ответом обработчика: проверка по response_model и JSONResponse."""
+    return JSONResponse(content=run_coroutine(serialize_response(field=field, response_content=content))).body
+
+
+def build_cases(sizes: List[int]) -> Dict[str, Callable[[], Any]]:
+    cases: Dict[str, Callable[[], Any]] = {}
+    products_field = create_model_field(name="Response_products", type_=list[Product], mode="serialization")
+    cart_field = create_model_field(name="Response_cart", type_=List[Cart], mode="serialization")
+
+    for size in sizes:
+        products = product_rows(size)
+        carts = cart_rows(size)
+        models = [Product(**row) for row in products]
+        icons = rows_with_icons(products)
+
+        cases[f"product_models[{size}]"] = lambda rows=products: [Product(**row) for row in rows]
+        cases[f"cart_models[{size}]"] = lambda rows=carts: [Cart(**row) for row in rows]
+        # Путь через response_model: строки каталога и модели корзины проверяются повторно
+        cases[f"response_model_products[{size}]"] = lambda rows=products: response_model_path(products_field, rows)
+        cases[f"response_model_product_models[{size}]"] = (
+            lambda rows=models: response_model_path(products_field, rows)
+        )
+        cases[f"response_model_cart[{size}]"] = (
+            lambda rows=carts: response_model_path(cart_field, [Cart(**row) for row in rows])
+        )
+        # Путь read_products и get_cart: строки запроса сразу в JSON
+        cases[f"fast_json_products[{size}]"] = lambda rows=products: FastJSONResponse(content=rows).body
+        cases[f"fast_json_cart[{size}]"] = lambda rows=carts: FastJSONResponse(content=rows).body
+        cases[f"json_catalog[{size}]"] = lambda rows=products: JSONResponse(content=rows).body
+        cases[f"json_catalog_icons[{size}]"] = lambda rows=icons: JSONResponse(content=rows).body
+        cases[f"json_export_ndjson[{size}]"] = (
+            lambda rows=products: b"".join(orjson.dumps(row) + b"\n" for row in rows)
+        )
+
+    token = create_jwt("benchmark", UserRole.USER, user_id=1)
+    header = f"Bearer {token}"
+    cases["jwt_create"] = lambda: create_jwt("benchmark", UserRole.USER, user_id=1)
+    cases["jwt_check_cached"] = lambda: check_jwt(header)
+
+    def check_uncached() -> Any:
+        jwt_cache.clear()
+        return check_jwt(header)
+    cases["jwt_check_uncached"] = check_uncached
+    return cases
+
+
+def measure(function: Callable[[], Any], repeat: int, min_time: float) -> Dict[str, float]:
+    """Время одного вызова: число вызовов подбирается так, чтобы серия шла не меньше min_time."""
+    function()
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            function()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time:
+            break
+        number *= 2 if elapsed <= 0 else max(2, min(10, int(min_time / elapsed) + 1))
+
+    timings = [elapsed / number]
+    for _ in range(repeat - 1):
+        started = time.perf_counter()
+        for _ in range(number):
+            function()
+        timings.append((time.perf_counter() - started) / number)
+    return {
+        "number": number,
+        "min_us": min(timings) * 1e6,
+        "median_us": statistics.median(timings) * 1e6,
+        "stdev_us": statistics.stdev(timings) * 1e6 if len(timings) > 1 else 0.0
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], threshold: float) -> List[str]:
+    """Замеры, медиана которых выросла больше чем на threshold относительно baseline."""
+    regressions = []
+    for name, row in results.items():
+        base = baseline.get(name)
+        if not base or not base["median_us"]:
+            continue
+        change = (row["median_us"] - base["median_us"]) / base["median_us"]
+        row["change"] = change
+        if change > threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Микробенчмарки сериализации, проверки моделей и JWT")
+    parser.add_argument("--sizes", default="10,100,1000", help="Размеры каталога через запятую")
+    parser.add_argument("--filter", default="", help="Запускать только замеры, в имени которых есть подстрока")
+    parser.add_argument("--repeat", type=int, default=5, help="Серий на замер")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Минимальная длительность серии, сек.")
+    parser.add_argument("--output", help="Куда сохранить результаты (JSON)")
+    parser.add_argument("--baseline", help="Результаты, с которыми сравнить (JSON)")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Допустимое замедление медианы, доля")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    results: Dict[str, dict] = {}
+    for name, function in build_cases(sizes).items():
+        if args.filter in name:
+            results[name] = measure(function, args.repeat, args.min_time)
+
+    regressions: List[str] = []
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            regressions = compare(results, json.load(file)["results"], args.threshold)
+
+    width = max(map(len, results), default=10)
+    print(f"{'замер':<{width}}{'медиана мкс':>14}{'мин мкс':>12}{'изменение':>12}")
+    for name, row in results.items():
+        change = f"{row['change'] * 100:+.1f}%" if "change" in row else ""
+        mark = "  !" if name in regressions else ""
+        print(f"{name:<{width}}{row['median_us']:>14.1f}{row['min_us']:>12.1f}{change:>12}{mark}")
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump({
+                "meta": {
+                    "commit": git_commit(),
+                    "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")}
+                },
+                "results": results
+            }, file, ensure_ascii=False, indent=2)
+
+    if regressions:
+        print(f"Замедление больше {args.threshold * 100:.0f}%: {', '.join(regressions)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
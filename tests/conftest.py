@@ -0,0 +1,15 @@
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Настройки читаются при импорте app.static, поэтому задаются до импорта приложения
+os.environ.setdefault("SECRET_KEY", "test-secret")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("DATA_SOURCE", "host=127.0.0.1 dbname=test")
+os.environ.setdefault("METRICS_DIR", tempfile.mkdtemp(prefix="server-test-metrics-"))
+
+# Журналы пишутся по относительному пути logs/app.log: тесты не должны менять файлы репозитория
+os.chdir(tempfile.mkdtemp(prefix="server-test-"))
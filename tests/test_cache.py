@@ -0,0 +1,89 @@
+from app import cache as cache_module
+from app.cache import TTLCache, VersionRegistry
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_ttl_cache_expires_entries(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_module.time, "monotonic", clock)
+    cache = TTLCache("test-expiry", max_size=10, ttl=5)
+    cache.set("key", "value")
+
+    assert cache.get("key") == "value"
+    clock.now += 5
+    assert cache.get("key") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache("test-lru", max_size=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_ttl_cache_ignores_values_read_before_invalidation():
+    cache = TTLCache("test-generation", max_size=10, ttl=60)
+    generation = cache.generation
+    cache.invalidate("key")
+    cache.set("key", "stale", generation)
+
+    assert cache.get("key") is None
+
+
+def test_ttl_cache_disabled_without_ttl():
+    cache = TTLCache("test-disabled", max_size=10, ttl=0)
+    cache.set("key", "value")
+
+    assert cache.get("key") is None
+
+
+def test_version_registry_keeps_newest_version():
+    versions = VersionRegistry("test", max_size=10)
+    versions.update(1, 5)
+    versions.update(1, 3)
+
+    assert versions.get(1) == 5
+
+
+def test_version_registry_drops_versions_read_before_invalidation():
+    versions = VersionRegistry("test", max_size=10)
+    generation = versions.generation
+    versions.invalidate(1)
+    versions.update(1, 2, generation)
+    assert versions.get(1) is None
+
+    generation = versions.generation
+    versions.reset()
+    versions.update(1, 2, generation)
+    assert versions.get(1) is None
+
+
+def test_version_registry_evicts_oldest_key():
+    versions = VersionRegistry("test", max_size=2)
+    versions.update(1, 1)
+    versions.update(2, 1)
+    versions.get(1)
+    versions.update(3, 1)
+
+    assert versions.get(2) is None
+    assert versions.get(1) == 1
+
+
+def test_version_registry_etag_includes_key_and_versions():
+    versions = VersionRegistry("cart", max_size=2)
+
+    assert versions.etag(7, 3, 12) == 'W/"cart-7-3-12"'
+    assert versions.etag(None, 4) == 'W/"cart-4"'
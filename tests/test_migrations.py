@@ -0,0 +1,60 @@
+from contextlib import contextmanager
+from unittest import mock
+
+import pytest
+
+from app.database import migrations
+from app.database.migrations import ExpectedIndex, MIGRATIONS, SchemaVersionError
+
+
+def test_index_key_must_start_with_columns():
+    index = ExpectedIndex("products", ["name", "id"], "test")
+
+    assert index.matches(["name", "id"], [], False, "btree")
+    assert index.matches(["name", "id", "cost"], [], True, "btree")
+    assert not index.matches(["id", "name"], [], False, "btree")
+    assert not index.matches(["name"], [], False, "btree")
+
+
+def test_unique_index_must_be_unique_on_exactly_columns():
+    index = ExpectedIndex("cart", ["user_id", "product_id"], "test", unique=True)
+
+    assert index.matches(["user_id", "product_id"], [], True, "btree")
+    assert not index.matches(["user_id", "product_id"], [], False, "btree")
+    assert not index.matches(["user_id", "product_id", "amount"], [], True, "btree")
+
+
+def test_included_columns_may_be_keys_or_include():
+    index = ExpectedIndex("cart", ["user_id"], "test", include=["id", "amount"])
+
+    assert index.matches(["user_id"], ["id", "amount"], False, "btree")
+    assert index.matches(["user_id", "amount"], ["id"], False, "btree")
+    assert not index.matches(["user_id"], ["id"], False, "btree")
+
+
+def test_index_method_must_match():
+    index = ExpectedIndex("products", ["search_document"], "test", method="gin")
+
+    assert index.matches(["search_document"], [], False, "gin")
+    assert not index.matches(["search_document"], [], False, "btree")
+
+
+def test_migration_versions_are_sequential():
+    assert [migration.version for migration in MIGRATIONS] == list(range(1, len(MIGRATIONS) + 1))
+
+
+def test_strict_check_rejects_outdated_schema(monkeypatch):
+    @contextmanager
+    def fake_connection():
+        yield mock.MagicMock()
+
+    monkeypatch.setattr(migrations, "get_connection", fake_connection)
+    monkeypatch.setattr(migrations, "missing_indexes", lambda cur: [])
+    monkeypatch.setattr(migrations, "schema_version", lambda cur: MIGRATIONS[-1].version - 1)
+
+    assert not migrations.check_schema()
+    with pytest.raises(SchemaVersionError):
+        migrations.check_schema(strict=True)
+
+    monkeypatch.setattr(migrations, "schema_version", lambda cur: MIGRATIONS[-1].version)
+    assert migrations.check_schema(strict=True)
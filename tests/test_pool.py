@@ -0,0 +1,113 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+from psycopg2 import extensions
+
+from app.database import connect as connect_module
+from app.database.connect import ConnectionPool, PoolTimeoutError
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+        self.rollbacks = 0
+
+    @property
+    def info(self):
+        return SimpleNamespace(transaction_status=self.status)
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+@pytest.fixture(autouse=True)
+def fake_connect(monkeypatch):
+    monkeypatch.setattr(connect_module, "connect", FakeConnection)
+
+
+def make_pool(**overrides) -> ConnectionPool:
+    options = dict(min_size=0, max_size=2, timeout=0.05, max_idle=300, max_lifetime=3600, check_interval=300)
+    options.update(overrides)
+    return ConnectionPool(**options)
+
+
+def test_returned_connection_is_reused():
+    pool = make_pool()
+    conn = pool.getconn()
+    pool.putconn(conn)
+
+    assert pool.getconn() is conn
+    assert pool.stats()["opened"] == 1
+
+
+def test_open_transaction_is_rolled_back_on_return():
+    pool = make_pool()
+    conn = pool.getconn()
+    conn.status = extensions.TRANSACTION_STATUS_INTRANS
+    pool.putconn(conn)
+
+    assert conn.rollbacks == 1
+    assert pool.idle == 1
+
+
+@pytest.mark.parametrize("broken", ["closed", "unknown"])
+def test_broken_connection_is_discarded(broken):
+    pool = make_pool()
+    conn = pool.getconn()
+    if broken == "closed":
+        conn.closed = 1
+    else:
+        conn.status = extensions.TRANSACTION_STATUS_UNKNOWN
+    pool.putconn(conn)
+
+    assert pool.size == 0
+    assert pool.idle == 0
+    assert pool.stats()["discarded"] == 1
+
+
+def test_exhausted_pool_times_out():
+    pool = make_pool(max_size=1)
+    pool.getconn()
+
+    with pytest.raises(PoolTimeoutError):
+        pool.getconn()
+    assert pool.stats()["timeouts"] == 1
+
+
+def test_idle_connections_above_min_size_are_closed():
+    pool = make_pool(min_size=1, max_size=3, max_idle=0)
+    connections = [pool.getconn() for _ in range(3)]
+    for conn in connections:
+        pool.putconn(conn)
+    time.sleep(0.01)
+    pool.putconn(pool.getconn())
+
+    assert pool.size == 1
+    assert sum(conn.closed for conn in connections) == 2
+
+
+def test_connection_past_max_lifetime_is_not_kept():
+    pool = make_pool(max_lifetime=0)
+    conn = pool.getconn()
+    time.sleep(0.01)
+    pool.putconn(conn)
+
+    assert conn.closed
+    assert pool.size == 0
+
+
+def test_close_closes_idle_connections_and_rejects_checkouts():
+    pool = make_pool()
+    conn = pool.getconn()
+    pool.putconn(conn)
+    pool.close()
+
+    assert conn.closed
+    with pytest.raises(PoolTimeoutError):
+        pool.getconn()
@@ -0,0 +1,67 @@
+from app.database import statements as statements_module
+from app.database.statements import PreparedStatement, prepare
+
+
+class FakeConnection:
+    pass
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.executed = []
+
+    def execute(self, query, params=None):
+        self.executed.append(query)
+
+
+def test_named_parameters_become_positional():
+    item = PreparedStatement("test_positional", """
+        SELECT * FROM cart WHERE user_id = %(user_id)s AND product_id = %(product_id)s;
+    """)
+
+    assert item.prepare_sql == ("PREPARE test_positional AS SELECT * FROM cart "
+                                "WHERE user_id = $1 AND product_id = $2")
+    assert item.execute_sql == "EXECUTE test_positional(%(user_id)s, %(product_id)s)"
+    assert item.parameters == ["user_id", "product_id"]
+
+
+def test_repeated_parameter_keeps_its_position_and_percent_is_unescaped():
+    item = PreparedStatement("test_repeated", "SELECT %(text)s, name %% %(text)s, %(limit)s")
+
+    assert item.prepare_sql == "PREPARE test_repeated AS SELECT $1, name % $1, $2"
+    assert item.execute_sql == "EXECUTE test_repeated(%(text)s, %(limit)s)"
+
+
+def test_statement_without_parameters():
+    item = PreparedStatement("test_plain", "SELECT 1")
+
+    assert item.execute_sql == "EXECUTE test_plain"
+
+
+def test_prepare_runs_prepare_once_per_connection(monkeypatch):
+    monkeypatch.setattr(statements_module, "DB_PREPARED_STATEMENTS", True)
+    first = PreparedStatement("test_first", "SELECT %(a)s")
+    second = PreparedStatement("test_second", "SELECT %(b)s")
+    connection = FakeConnection()
+
+    cursor = FakeCursor(connection)
+    assert prepare(cursor, first, second) == "EXECUTE test_first(%(a)s);\nEXECUTE test_second(%(b)s)"
+    assert cursor.executed == [first.prepare_sql, second.prepare_sql]
+
+    cursor = FakeCursor(connection)
+    prepare(cursor, first)
+    assert cursor.executed == []
+
+    cursor = FakeCursor(FakeConnection())
+    prepare(cursor, first)
+    assert cursor.executed == [first.prepare_sql]
+
+
+def test_prepare_returns_plain_sql_when_disabled(monkeypatch):
+    monkeypatch.setattr(statements_module, "DB_PREPARED_STATEMENTS", False)
+    item = PreparedStatement("test_disabled", "SELECT %(a)s")
+    cursor = FakeCursor(FakeConnection())
+
+    assert prepare(cursor, item) == "SELECT %(a)s"
+    assert cursor.executed == []
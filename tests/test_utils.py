@@ -0,0 +1,52 @@
+import pytest
+
+from app.models.product import ProductSort
+from app.routers.product import _cursor_key
+from app.utils import decode_cursor, encode_cursor, etag_matches, parse_etags
+
+
+def test_cursor_round_trip():
+    payload = {"sort": "name", "key": ["Чайник", 42]}
+
+    assert decode_cursor(encode_cursor(payload)) == payload
+
+
+@pytest.mark.parametrize("token", ["not base64!", "W10", encode_cursor({})[:-1] + "%"])
+def test_damaged_cursor_is_rejected(token):
+    with pytest.raises(ValueError):
+        decode_cursor(token)
+
+
+@pytest.mark.parametrize("sort, key", [
+    (ProductSort.ID, [1]),
+    (ProductSort.NAME, ["Чайник", 1])
+])
+def test_cursor_key_matches_sort(sort, key):
+    assert _cursor_key({"key": key}, sort) == tuple(key)
+
+
+@pytest.mark.parametrize("sort, key", [
+    (ProductSort.ID, [[1]]),
+    (ProductSort.ID, [1, 2]),
+    (ProductSort.ID, ["1"]),
+    (ProductSort.ID, [True]),
+    (ProductSort.ID, {"id": 1}),
+    (ProductSort.ID, None),
+    (ProductSort.NAME, [1, 2]),
+    (ProductSort.NAME, ["Чайник"])
+])
+def test_cursor_key_rejects_tampered_keys(sort, key):
+    with pytest.raises(ValueError):
+        _cursor_key({"key": key}, sort)
+
+
+def test_parse_etags_strips_weak_prefix_and_quotes():
+    assert parse_etags('W/"a-1", "b"') == ["a-1", "b"]
+    assert parse_etags(None) == []
+
+
+def test_etag_matches():
+    assert etag_matches('W/"catalog-3"', 'W/"catalog-3"')
+    assert etag_matches('"catalog-3"', 'W/"catalog-3"')
+    assert etag_matches("*", 'W/"catalog-3"')
+    assert not etag_matches('W/"catalog-2"', 'W/"catalog-3"')